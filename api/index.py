@@ -11,7 +11,7 @@ parent_dir = str(Path(__file__).parent.parent)
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
 import logging
@@ -39,21 +39,25 @@ try:
     from src.models import db
     from src.auth import init_jwt
     
+    from src.quota_service import quota_service
+    from src.login_tracker import last_login_tracker
+    from src.sqlite_writer import sqlite_writer
+    from src.read_routing import read_router
+    
+    from src.db_bootstrap import database_initializer
+    from src.db_engine import database_profile
+    
+    # Perfil del pool (serverless por defecto en Vercel) antes de crear el motor
+    database_profile.init_app(app)
     db.init_app(app)
     init_jwt(app)
+    sqlite_writer.init_app(app)
+    read_router.init_app(app)
+    quota_service.init_app(app)
+    last_login_tracker.init_app(app)
     
-    @app.before_request
-    def initialize_database():
-        """Initialize database on first request"""
-        if not hasattr(app, '_db_initialized'):
-            try:
-                with app.app_context():
-                    db.create_all()
-                    app._db_initialized = True
-                    logger.info("✅ Database initialized")
-            except Exception as e:
-                logger.error(f"❌ Database initialization failed: {e}")
-                app._db_initialized = False
+    # db.create_all() una vez por proceso; si falla, reintentos con backoff
+    database_initializer.init_app(app)
     
     logger.info("✅ Database configuration loaded")
 except Exception as e:
@@ -99,7 +103,10 @@ except ImportError as e:
     logger.warning(f"⚠️  Subscription routes not loaded: {e}")
 
 try:
-    from routes.astrology_routes import astrology_bp
+    # swisseph, pytz y Gemini se importan en la primera petición que los usa
+    from routes.astrology_routes import astrology_available, astrology_bp
+    if not astrology_available():
+        raise ImportError("No module named 'swisseph'")
     app.register_blueprint(astrology_bp)
     ROUTES_LOADED['astrology'] = True
     logger.info("✅ Astrology routes loaded")
@@ -120,6 +127,18 @@ def health_check():
         'routes': ROUTES_LOADED
     }), 200
 
+@app.route('/api/health/db', methods=['GET'])
+def database_health():
+    """Connection pool profile and telemetry (checkouts, wait time, overflow)"""
+    try:
+        return jsonify({
+            **database_profile.metrics(db.engine),
+            'writer': sqlite_writer.metrics(),
+            'replica': read_router.metrics()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': 'Database not configured', 'message': str(e)}), 503
+
 @app.route('/api/info', methods=['GET'])
 def api_info():
     """API information endpoint"""
@@ -200,17 +219,13 @@ def internal_error(error):
         pass
     return jsonify({'error': 'Internal server error', 'message': 'An unexpected error occurred'}), 500
 
-# Request/Response logging middleware
-@app.before_request
-def log_request():
-    """Log incoming requests"""
-    logger.info(f"→ {request.method} {request.path} from {request.remote_addr}")
-
-@app.after_request
-def log_response(response):
-    """Log outgoing responses"""
-    logger.info(f"← {request.method} {request.path} → {response.status_code}")
-    return response
+# Request/Response logging: sampled, JSON lines written by a background listener
+from src.request_logging import init_request_logging
+init_request_logging(app)
+
+# Response compression: brotli (if installed) or gzip above COMPRESS_MIN_SIZE
+from src.compression import init_compression
+init_compression(app)
 
 # CORS preflight handler
 @app.route('/api/<path:path>', methods=['OPTIONS'])
@@ -6,7 +6,14 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from config import Config
 from src.models import db
+from src.db_engine import database_profile
 from src.auth import init_jwt
+from src.quota_service import quota_service
+from src.sqlite_writer import sqlite_writer
+from src.read_routing import read_router
+from src.compression import init_compression
+from src.login_tracker import last_login_tracker
+from src.cli import register_commands
 import os
 
 # Importar blueprints
@@ -22,13 +29,15 @@ def create_app(config_class=Config):
     app = Flask(__name__, static_folder='.')
     app.config.from_object(config_class)
     
-    # Inicializar extensiones
+    # Inicializar extensiones (el perfil del pool antes de crear el motor)
+    database_profile.init_app(app)
     db.init_app(app)
     init_jwt(app)
     CORS(app, origins=config_class.CORS_ORIGINS, supports_credentials=True)
     
     # Migraciones
     migrate = Migrate(app, db)
+    register_commands(app)
     
     # Registrar blueprints
     app.register_blueprint(auth_bp)
@@ -41,6 +50,22 @@ def create_app(config_class=Config):
     with app.app_context():
         db.create_all()
     
+    # Escritor único SQLite (si SQLITE_WRITER_QUEUE); antes que los volcados
+    # periódicos, que escriben a través de él
+    sqlite_writer.init_app(app)
+    
+    # Réplica de lectura para las rutas GET (si DATABASE_REPLICA_URL)
+    read_router.init_app(app)
+    
+    # Cupos en memoria (si QUOTA_BACKEND == 'memory')
+    quota_service.init_app(app)
+    
+    # Último login por lotes
+    last_login_tracker.init_app(app)
+    
+    # Compresión brotli/gzip de las respuestas grandes
+    init_compression(app)
+    
     # Rutas básicas
     @app.route('/')
     def index():
@@ -61,6 +86,15 @@ def create_app(config_class=Config):
             'version': '1.0.0'
         }), 200
     
+    @app.route('/api/health/db', methods=['GET'])
+    def database_health():
+        """Perfil del pool de conexiones y su telemetría (checkouts, espera, overflow)"""
+        return jsonify({
+            **database_profile.metrics(db.engine),
+            'writer': sqlite_writer.metrics(),
+            'replica': read_router.metrics()
+        }), 200
+    
     @app.route('/api/info', methods=['GET'])
     def api_info():
         """Información de la API"""
@@ -29,22 +29,87 @@ class Config:
         SQLALCHEMY_DATABASE_URI = 'sqlite:///tarot.db'
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,  # Verify connections before using
-        'pool_recycle': 300,    # Recycle connections after 5 minutes
-        'pool_size': 10 if not IS_VERCEL else 1,  # Smaller pool for serverless
-        'max_overflow': 20 if not IS_VERCEL else 0
-    }
+    # Pool de conexiones según el destino de despliegue (src.db_engine.PROFILES):
+    # auto (serverless en Vercel, single en otro caso), serverless, single o
+    # multi_worker. Lo definido aquí tiene prioridad sobre el perfil.
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'auto')
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    
+    # Réplica de lectura opcional para las rutas GET (src.read_routing); tras
+    # una mutación, el usuario lee de la principal durante READ_YOUR_WRITES_SECONDS
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    if SQLALCHEMY_REPLICA_URI and SQLALCHEMY_REPLICA_URI.startswith('postgres://'):
+        SQLALCHEMY_REPLICA_URI = SQLALCHEMY_REPLICA_URI.replace('postgres://', 'postgresql://', 1)
+    READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '5'))
+    
+    # Pragmas aplicados a cada conexión SQLite
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    
+    # Escritor único SQLite (src.sqlite_writer): las escrituras calientes se
+    # encolan y se confirman por lotes desde un hilo dedicado
+    SQLITE_WRITER_QUEUE = os.environ.get('SQLITE_WRITER_QUEUE', 'false').lower() == 'true'
+    SQLITE_WRITER_BATCH_SIZE = int(os.environ.get('SQLITE_WRITER_BATCH_SIZE', '64'))
+    SQLITE_WRITER_MAX_DELAY_MS = float(os.environ.get('SQLITE_WRITER_MAX_DELAY_MS', '2'))
+    SQLITE_WRITER_TIMEOUT_SECONDS = float(os.environ.get('SQLITE_WRITER_TIMEOUT_SECONDS', '30'))
     
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
+    # Caché entre peticiones del plan/estado premium por usuario
+    PLAN_CACHE_TTL_SECONDS = float(os.environ.get('PLAN_CACHE_TTL_SECONDS', '30'))
+    PLAN_CACHE_SIZE = int(os.environ.get('PLAN_CACHE_SIZE', '10000'))
+    
+    # Hash de contraseñas (método de werkzeug, p. ej. 'scrypt:32768:8:1' o
+    # 'pbkdf2:sha256:600000'); los hashes con otro método se rehacen al iniciar sesión
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))  # 0 = en el hilo
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32'))
+    PASSWORD_HASH_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_ACQUIRE_TIMEOUT_SECONDS', '5'))
+    
+    # Revocación de tokens: cada proceso refresca su filtro de Bloom con las
+    # revocaciones nuevas como mucho cada TOKEN_REVOCATION_REFRESH_SECONDS
+    TOKEN_REVOCATION_REFRESH_SECONDS = float(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', '5'))
+    TOKEN_REVOCATION_BLOOM_CAPACITY = int(os.environ.get('TOKEN_REVOCATION_BLOOM_CAPACITY', '100000'))
+    TOKEN_REVOCATION_BLOOM_ERROR_RATE = float(os.environ.get('TOKEN_REVOCATION_BLOOM_ERROR_RATE', '0.001'))
+    
+    # Presupuesto de arranque en frío: importación de la app + primera petición
+    # (python -m src.startup_profile benchmark)
+    COLD_START_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', '800'))
+    
+    # Inicialización de la base de datos: reintentos con backoff exponencial
+    DB_INIT_RETRY_BASE_SECONDS = float(os.environ.get('DB_INIT_RETRY_BASE_SECONDS', '1'))
+    DB_INIT_RETRY_MAX_SECONDS = float(os.environ.get('DB_INIT_RETRY_MAX_SECONDS', '60'))
+    
+    # Log de peticiones: fracción muestreada (los 5xx y las lentas siempre se registran)
+    REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '0.01'))
+    REQUEST_LOG_SLOW_MS = float(os.environ.get('REQUEST_LOG_SLOW_MS', '1000'))
+    REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', '10000'))
+    
+    # Compresión de respuestas (src.compression): brotli si está instalado, si no gzip
+    RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', '4'))
+    
     # Freemium Limits
     FREE_DAILY_READINGS = 3
     FREE_ALLOWED_SPREADS = ['una_carta', 'tres_cartas']
     
+    # Cupos: 'database' (UPSERT atómico por lectura) o 'memory' (contadores en
+    # memoria por proceso con volcado diferido a usage_limits; con DB_PROFILE
+    # serverless siempre 'database')
+    QUOTA_BACKEND = os.environ.get('QUOTA_BACKEND', 'database')
+    QUOTA_FLUSH_INTERVAL_SECONDS = float(os.environ.get('QUOTA_FLUSH_INTERVAL_SECONDS', '5'))
+    
+    # Volcado por lotes de users.last_login (con DB_PROFILE serverless siempre se
+    # escribe en cada login: no hay hilos de fondo fiables)
+    LAST_LOGIN_FLUSH_INTERVAL_SECONDS = float(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL_SECONDS', '5'))
+    
     # CORS - Allow Vercel domains
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '').split(',') if os.environ.get('CORS_ORIGINS') else [
         'http://localhost:3000',
@@ -56,10 +121,33 @@ class Config:
     # Pagination
     READINGS_PER_PAGE = 20
     
+    # Exportación / importación NDJSON del historial
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '500'))
+    
     # Google Gemini AI Configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-pro')
     
+    # Límites de tráfico hacia Gemini (compartidos por todos los hilos del proceso)
+    GEMINI_RATE_LIMIT_PER_SECOND = float(os.environ.get('GEMINI_RATE_LIMIT_PER_SECOND', '1.0'))
+    GEMINI_BURST = int(os.environ.get('GEMINI_BURST', '5'))
+    GEMINI_INITIAL_CONCURRENCY = int(os.environ.get('GEMINI_INITIAL_CONCURRENCY', '4'))
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', '16'))
+    GEMINI_LATENCY_TARGET_SECONDS = float(os.environ.get('GEMINI_LATENCY_TARGET_SECONDS', '10'))
+    GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', '3'))
+    GEMINI_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_ACQUIRE_TIMEOUT_SECONDS', '20'))
+    
+    # Backend de interpretaciones: 'gemini' o 'stub' (local, sin red, para pruebas de carga)
+    INTERPRETATION_BACKEND = os.environ.get('INTERPRETATION_BACKEND', 'gemini')
+    STUB_BACKEND_LATENCY_MS = float(os.environ.get('STUB_BACKEND_LATENCY_MS', '0'))
+    STUB_BACKEND_LATENCY_JITTER_MS = float(os.environ.get('STUB_BACKEND_LATENCY_JITTER_MS', '0'))
+    STUB_BACKEND_ERROR_RATE = float(os.environ.get('STUB_BACKEND_ERROR_RATE', '0'))
+    STUB_BACKEND_SEED = int(os.environ['STUB_BACKEND_SEED']) if os.environ.get('STUB_BACKEND_SEED') else None
+    
+    # 'batched': un solo prompt por carta natal con salida JSON; 'sections': una llamada por sección
+    GEMINI_INTERPRETATION_MODE = os.environ.get('GEMINI_INTERPRETATION_MODE', 'batched')
+    
     # Astrology Configuration
     ASTROLOGY_ENABLED = True
     FREE_ASTROLOGY_READINGS = 2  # Lecturas astrológicas gratuitas por día
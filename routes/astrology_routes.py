@@ -1,20 +1,30 @@
 """
 Rutas para cálculos astrológicos y cartas natales
+
+swisseph (src.astrology_calculator), pytz y el cliente de Gemini
+(src.gemini_service) se importan dentro de las vistas que los usan: registrar
+el blueprint no los carga, así que el arranque en frío de peticiones que no
+tocan astrología (salud, auth, lecturas) no paga su coste.
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity
-from src.models import BirthChart, AspectRecord, User, db
-from src.auth import login_required
-from src.astrology_calculator import (
-    AstrologyCalculator,
-    HouseSystem,
-    calculate_houses_and_aspects
-)
-from src.gemini_service import GeminiAstrologyService
+from sqlalchemy.orm import undefer_group
+from src.models import BirthChart, AspectRecord, db
+from src.auth import current_user_id, get_current_user, login_required
+from src.http_cache import compute_etag, not_modified, with_etag
+from src.json_response import json_response
+from src.pagination import keyset_paginate
+from src.read_routing import route_reads_to_replica
 from datetime import datetime
-import pytz
+import importlib.util
 
 astrology_bp = Blueprint('astrology', __name__, url_prefix='/api/astrology')
+# Las consultas de las rutas GET van a la réplica de lectura (si hay)
+astrology_bp.before_request(route_reads_to_replica)
+
+
+def astrology_available():
+    """True si swisseph está instalado (comprueba sin importarlo)"""
+    return importlib.util.find_spec('swisseph') is not None
 
 
 @astrology_bp.route('/birth-chart', methods=['POST'])
@@ -35,9 +45,12 @@ def create_birth_chart():
         "name": "Mi Carta Natal"  // Opcional
     }
     """
+    from src.astrology_calculator import AstrologyCalculator, HouseSystem
+    from src.gemini_service import GeminiAstrologyService
+    import pytz
+    
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -123,10 +136,10 @@ def create_birth_chart():
         db.session.add(birth_chart)
         db.session.commit()
         
-        return jsonify({
+        return json_response({
             'message': 'Carta natal calculada exitosamente',
-            'birth_chart': birth_chart.to_dict(include_full_data=True)
-        }), 201
+            'birth_chart': birth_chart.to_dict(include_full_data=True, raw_json=True)
+        }, 201)
         
     except ValueError as e:
         return jsonify({'error': f'Error en los datos: {str(e)}'}), 400
@@ -138,18 +151,38 @@ def create_birth_chart():
 @astrology_bp.route('/birth-chart/<int:chart_id>', methods=['GET'])
 @login_required
 def get_birth_chart(chart_id):
-    """Obtiene una carta natal específica"""
+    """
+    Obtiene una carta natal específica
+    
+    Responde con una ETag calculada de (id, updated_at); con If-None-Match
+    vigente devuelve 304 sin leer los datos calculados ni las interpretaciones.
+    """
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
-        birth_chart = BirthChart.query.filter_by(id=chart_id, user_id=user_id).first()
+        version = db.session.query(BirthChart.id, BirthChart.updated_at).filter_by(
+            id=chart_id, user_id=user_id
+        ).first()
+        
+        if not version:
+            return jsonify({'error': 'Carta natal no encontrada'}), 404
+        
+        cached = not_modified(compute_etag('birth_chart', version.id, version.updated_at))
+        if cached is not None:
+            return cached
+        
+        birth_chart = BirthChart.query.filter_by(id=chart_id, user_id=user_id).options(
+            undefer_group('payload')
+        ).first()
         
         if not birth_chart:
             return jsonify({'error': 'Carta natal no encontrada'}), 404
         
-        return jsonify({
-            'birth_chart': birth_chart.to_dict(include_full_data=True)
-        }), 200
+        # De la fila leída: puede haber cambiado desde la primera consulta
+        etag = compute_etag('birth_chart', birth_chart.id, birth_chart.updated_at)
+        return with_etag(json_response({
+            'birth_chart': birth_chart.to_dict(include_full_data=True, raw_json=True)
+        }, 200), etag)
         
     except Exception as e:
         return jsonify({'error': 'Error al obtener carta natal', 'details': str(e)}), 500
@@ -158,26 +191,42 @@ def get_birth_chart(chart_id):
 @astrology_bp.route('/birth-charts', methods=['GET'])
 @login_required
 def get_birth_charts():
-    """Obtiene todas las cartas natales del usuario"""
+    """
+    Obtiene todas las cartas natales del usuario
+    
+    Por defecto la paginación es por cursor (`pagination.next_cursor` se envía
+    como `cursor`); con `page` se usa la paginación clásica por número de página.
+    
+    Query params opcionales:
+        cursor: Cursor devuelto por la página anterior
+        include_total: true para incluir el total de cartas (consulta COUNT extra)
+        page: Número de página (modo clásico, incluye siempre el total)
+        fields: Campos a devolver separados por comas. Por defecto solo los
+            datos de resumen; los datos calculados no se leen de la base de datos
+    """
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
+        
+        try:
+            fields = BirthChart.parse_fields(request.args.get('fields')) or BirthChart.SUMMARY_FIELDS
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Parámetros de paginación
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        # Query
-        query = BirthChart.query.filter_by(user_id=user_id).order_by(BirthChart.created_at.desc())
-        
-        # Paginación
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        # No incluir datos completos en la lista
-        charts = [chart.to_dict(include_full_data=False) for chart in pagination.items]
+        # Query (solo las columnas de los campos pedidos, más las del cursor)
+        query = BirthChart.query.filter_by(user_id=user_id).options(
+            BirthChart.load_only_fields(set(fields) | {'id', 'created_at'})
+        )
         
-        return jsonify({
-            'birth_charts': charts,
-            'pagination': {
+        if 'page' in request.args:
+            # Paginación clásica (OFFSET + COUNT)
+            page = request.args.get('page', 1, type=int)
+            query = query.order_by(BirthChart.created_at.desc())
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            items = pagination.items
+            pagination_data = {
                 'page': page,
                 'per_page': per_page,
                 'total': pagination.total,
@@ -185,7 +234,24 @@ def get_birth_charts():
                 'has_next': pagination.has_next,
                 'has_prev': pagination.has_prev
             }
-        }), 200
+        else:
+            try:
+                items, pagination_data = keyset_paginate(
+                    query,
+                    BirthChart,
+                    per_page,
+                    cursor=request.args.get('cursor'),
+                    include_total=request.args.get('include_total', '').lower() in ('1', 'true')
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        charts = [chart.to_dict(raw_json=True, fields=fields) for chart in items]
+        
+        return json_response({
+            'birth_charts': charts,
+            'pagination': pagination_data
+        }, 200)
         
     except Exception as e:
         return jsonify({'error': 'Error al obtener cartas natales', 'details': str(e)}), 500
@@ -196,7 +262,7 @@ def get_birth_charts():
 def update_birth_chart(chart_id):
     """Actualiza una carta natal (nombre, notas, favorito)"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
         birth_chart = BirthChart.query.filter_by(id=chart_id, user_id=user_id).first()
         
@@ -232,7 +298,7 @@ def update_birth_chart(chart_id):
 def delete_birth_chart(chart_id):
     """Elimina una carta natal"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
         birth_chart = BirthChart.query.filter_by(id=chart_id, user_id=user_id).first()
         
@@ -266,6 +332,8 @@ def calculate_aspects():
         "include_minor": true
     }
     """
+    from src.astrology_calculator import AstrologyCalculator
+    
     try:
         data = request.get_json()
         
@@ -323,9 +391,10 @@ def interpret_placement():
         }
     }
     """
+    from src.gemini_service import GeminiAstrologyService, InterpretationError
+    
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -385,6 +454,8 @@ def interpret_placement():
             'type': interpretation_type
         }), 200
         
+    except InterpretationError as e:
+        return jsonify({'error': 'Servicio de interpretación no disponible', 'details': str(e)}), 503
     except KeyError as e:
         return jsonify({'error': f'Campo faltante en data: {str(e)}'}), 400
     except Exception as e:
@@ -402,10 +473,14 @@ def interpret_birth_chart(chart_id):
         "question": "¿Cuál es mi propósito de vida?"
     }
     """
+    from src.gemini_service import GeminiAstrologyService, InterpretationError
+    
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
-        birth_chart = BirthChart.query.filter_by(id=chart_id, user_id=user_id).first()
+        birth_chart = BirthChart.query.filter_by(id=chart_id, user_id=user_id).options(
+            undefer_group('payload')
+        ).first()
         
         if not birth_chart:
             return jsonify({'error': 'Carta natal no encontrada'}), 404
@@ -440,12 +515,22 @@ def interpret_birth_chart(chart_id):
             
         except ValueError as e:
             return jsonify({'error': str(e)}), 500
+        except InterpretationError as e:
+            return jsonify({'error': 'Servicio de interpretación no disponible', 'details': str(e)}), 503
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error al generar interpretaciones', 'details': str(e)}), 500
 
 
+@astrology_bp.route('/interpretation-metrics', methods=['GET'])
+@login_required
+def get_interpretation_metrics():
+    """Métricas de llamadas a Gemini (cola, en curso, reintentos, deduplicadas)"""
+    from src.gemini_service import get_interpretation_metrics as interpretation_metrics
+    return jsonify({'metrics': interpretation_metrics()}), 200
+
+
 @astrology_bp.route('/house-systems', methods=['GET'])
 def get_house_systems():
     """Obtiene información sobre los sistemas de casas disponibles"""
@@ -491,6 +576,8 @@ def get_house_systems():
 @astrology_bp.route('/timezones', methods=['GET'])
 def get_common_timezones():
     """Obtiene lista de zonas horarias comunes"""
+    import pytz
+    
     common_timezones = {
         'America': [
             'America/New_York',
@@ -546,6 +633,8 @@ def validate_location():
         "timezone": "America/Mexico_City"
     }
     """
+    import pytz
+    
     try:
         data = request.get_json()
         
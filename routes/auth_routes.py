@@ -2,9 +2,12 @@
 Rutas de autenticación
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity, jwt_required
+from flask_jwt_extended import decode_token, get_jwt, get_jwt_identity, jwt_required
+from sqlalchemy.exc import IntegrityError
 from src.models import User, db
-from src.auth import create_tokens, login_required
+from src.password_hashing import HashingOverloadedError, password_hasher
+from src.token_revocation import token_revocation
+from src.auth import create_tokens, create_user_access_token, login_required, get_current_user as load_current_user
 import re
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -50,7 +53,7 @@ def register():
         if User.query.filter_by(email=email).first():
             return jsonify({'error': 'El email ya está registrado'}), 409
         
-        if User.query.filter_by(username=username).first():
+        if User.query.filter_by(username_lower=User.normalize_username(username)).first():
             return jsonify({'error': 'El username ya está en uso'}), 409
         
         # Crear nuevo usuario
@@ -73,6 +76,13 @@ def register():
             **tokens
         }), 201
         
+    except IntegrityError:
+        # Registro simultáneo con el mismo email o username (índices únicos)
+        db.session.rollback()
+        return jsonify({'error': 'El email o el username ya están en uso'}), 409
+    except HashingOverloadedError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Servicio ocupado, inténtalo de nuevo en unos segundos', 'details': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error al registrar usuario', 'details': str(e)}), 500
@@ -84,16 +94,14 @@ def login():
     try:
         data = request.get_json()
         
-        email_or_username = data.get('email', '').strip().lower()
+        email_or_username = data.get('email', '').strip()
         password = data.get('password', '')
         
         if not email_or_username or not password:
             return jsonify({'error': 'Email/username y password son requeridos'}), 400
         
-        # Buscar usuario por email o username
-        user = User.query.filter(
-            (User.email == email_or_username) | (User.username == email_or_username)
-        ).first()
+        # Buscar usuario por email o username (consulta puntual indexada)
+        user = User.find_by_login(email_or_username)
         
         if not user or not user.check_password(password):
             return jsonify({'error': 'Credenciales inválidas'}), 401
@@ -101,6 +109,12 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Cuenta desactivada'}), 403
         
+        # Rehacer el hash si cambió el método o el coste configurado
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+            password_hasher.record_rehash()
+        
         # Crear tokens
         tokens = create_tokens(user)
         
@@ -109,6 +123,9 @@ def login():
             **tokens
         }), 200
         
+    except HashingOverloadedError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Servicio ocupado, inténtalo de nuevo en unos segundos', 'details': str(e)}), 503
     except Exception as e:
         return jsonify({'error': 'Error al iniciar sesión', 'details': str(e)}), 500
 
@@ -118,15 +135,14 @@ def login():
 def refresh():
     """Refresca el token de acceso"""
     try:
-        from flask_jwt_extended import create_access_token
-        
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
         
         if not user or not user.is_active:
             return jsonify({'error': 'Usuario no válido'}), 401
         
-        access_token = create_access_token(identity=user)
+        # Nuevo token de acceso con los derechos actuales del plan
+        access_token = create_user_access_token(user)
         
         return jsonify({
             'access_token': access_token,
@@ -142,8 +158,7 @@ def refresh():
 def get_current_user():
     """Obtiene información del usuario actual"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = load_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -159,9 +174,37 @@ def get_current_user():
 @auth_bp.route('/logout', methods=['POST'])
 @login_required
 def logout():
-    """Cierra sesión (en el cliente se debe eliminar el token)"""
-    # En una implementación más completa, aquí se podría agregar el token a una blacklist
-    return jsonify({'message': 'Logout exitoso'}), 200
+    """
+    Cierra sesión revocando el token de acceso actual
+    
+    Si el cuerpo incluye `refresh_token`, también se revoca.
+    """
+    try:
+        token_revocation.revoke(get_jwt())
+        
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token')
+        if refresh_token:
+            try:
+                refresh_payload = decode_token(refresh_token)
+            except Exception:
+                return jsonify({'error': 'Refresh token inválido'}), 400
+            if refresh_payload.get('sub') != get_jwt_identity():
+                return jsonify({'error': 'El refresh token no pertenece al usuario'}), 403
+            token_revocation.revoke(refresh_payload)
+        
+        return jsonify({'message': 'Logout exitoso'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error al cerrar sesión', 'details': str(e)}), 500
+
+
+@auth_bp.route('/hash-metrics', methods=['GET'])
+@login_required
+def get_hash_metrics():
+    """Métricas del pool de hash de contraseñas (cola, rechazos, tiempos)"""
+    return jsonify({'metrics': password_hasher.metrics()}), 200
 
 
 @auth_bp.route('/change-password', methods=['POST'])
@@ -170,8 +213,7 @@ def change_password():
     """Cambia la contraseña del usuario"""
     try:
         data = request.get_json()
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = load_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -197,6 +239,9 @@ def change_password():
         
         return jsonify({'message': 'Contraseña cambiada exitosamente'}), 200
         
+    except HashingOverloadedError as e:
+        db.session.rollback()
+        return jsonify({'error': 'Servicio ocupado, inténtalo de nuevo en unos segundos', 'details': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error al cambiar contraseña', 'details': str(e)}), 500
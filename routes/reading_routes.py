@@ -1,14 +1,31 @@
 """
 Rutas para lecturas de tarot
 """
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity
-from src.models import Reading, User, db
-from src.auth import login_required
+from datetime import datetime
+import json
+from flask import Blueprint, g, request, jsonify
+from sqlalchemy import insert, select
+from sqlalchemy.orm import load_only
+from src.models import Reading, db
+from src.auth import current_user_id, get_current_plan, login_required
+from src.http_cache import compute_etag, not_modified, with_etag
+from src.json_response import json_response
+from src.pagination import keyset_paginate
+from src.read_routing import route_reads_to_replica
+from src.reading_stats import (
+    rebuild_user_stats,
+    record_favorite_changed,
+    record_reading_created,
+    record_reading_deleted
+)
+from src.ndjson import chunked, ndjson_response, read_ndjson
+from src.sqlite_writer import sqlite_writer
 from src.middleware import require_reading_limit, require_spread_access, FreemiumMiddleware
 from config import Config
 
 reading_bp = Blueprint('reading', __name__, url_prefix='/api/readings')
+# Las consultas de las rutas GET van a la réplica de lectura (si hay)
+reading_bp.before_request(route_reads_to_replica)
 
 
 @reading_bp.route('/', methods=['POST'])
@@ -18,8 +35,7 @@ reading_bp = Blueprint('reading', __name__, url_prefix='/api/readings')
 def create_reading():
     """Crea una nueva lectura de tarot"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_plan()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -36,28 +52,33 @@ def create_reading():
         if not cards:
             return jsonify({'error': 'Cartas requeridas'}), 400
         
-        # Crear lectura
-        reading = Reading(
-            user_id=user.id,
-            spread_type=spread_type,
-            question=data.get('question', ''),
-            interpretation=data.get('interpretation', '')
-        )
-        reading.set_cards(cards)
-        
-        db.session.add(reading)
-        
-        # Incrementar contador de uso
-        FreemiumMiddleware.increment_reading_count(user)
-        
-        db.session.commit()
-        
-        # Obtener estadísticas actualizadas
-        usage_stats = FreemiumMiddleware.get_usage_stats(user)
+        user_id = user.id
+        
+        def write_reading():
+            reading = Reading(
+                user_id=user_id,
+                spread_type=spread_type,
+                question=data.get('question', ''),
+                interpretation=data.get('interpretation', '')
+            )
+            reading.set_cards(cards)
+            
+            db.session.add(reading)
+            record_reading_created(reading)
+            db.session.flush()
+            return reading.to_dict()
+        
+        # La lectura y sus estadísticas se confirman juntas (con la reserva de
+        # cupo de require_reading_limit, salvo con el escritor SQLite, que la
+        # confirma en su propia unidad)
+        reading_data = sqlite_writer.run(write_reading)
+        
+        # Estadísticas a partir del contador reservado, sin volver a consultar
+        usage_stats = FreemiumMiddleware.get_usage_stats(user, readings_today=g.get('readings_today'))
         
         return jsonify({
             'message': 'Lectura creada exitosamente',
-            'reading': reading.to_dict(),
+            'reading': reading_data,
             'usage': usage_stats
         }), 201
         
@@ -69,16 +90,33 @@ def create_reading():
 @reading_bp.route('/', methods=['GET'])
 @login_required
 def get_readings():
-    """Obtiene todas las lecturas del usuario con paginación"""
+    """
+    Obtiene todas las lecturas del usuario con paginación
+    
+    Por defecto la paginación es por cursor: la respuesta incluye
+    `pagination.next_cursor`, que se envía como `cursor` para la página
+    siguiente. Con `page` se usa la paginación clásica por número de página.
+    
+    Query params opcionales:
+        cursor: Cursor devuelto por la página anterior
+        include_total: true para incluir el total de lecturas (consulta COUNT extra)
+        page: Número de página (modo clásico, incluye siempre el total)
+        fields: Campos a devolver separados por comas (p. ej. id,spread_type,created_at);
+            solo se leen de la base de datos las columnas necesarias
+    
+    La ETag se calcula de (id, updated_at) de las lecturas de la página y de los
+    parámetros; con If-None-Match vigente se responde 304 sin leer el resto de
+    columnas ni serializar.
+    """
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user_id = current_user_id()
         
-        if not user:
-            return jsonify({'error': 'Usuario no encontrado'}), 404
+        try:
+            fields = Reading.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Parámetros de paginación
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', Config.READINGS_PER_PAGE, type=int)
         
         # Filtros
@@ -86,7 +124,11 @@ def get_readings():
         is_favorite = request.args.get('is_favorite', type=bool)
         
         # Query base
-        query = Reading.query.filter_by(user_id=user.id)
+        query = Reading.query.filter_by(user_id=user_id)
+        
+        # La página se lee primero sin contenido: id y created_at (cursor) y
+        # updated_at (ETag)
+        query = query.options(load_only(Reading.id, Reading.created_at, Reading.updated_at))
         
         # Aplicar filtros
         if spread_type:
@@ -95,17 +137,13 @@ def get_readings():
         if is_favorite is not None:
             query = query.filter_by(is_favorite=is_favorite)
         
-        # Ordenar por fecha descendente
-        query = query.order_by(Reading.created_at.desc())
-        
-        # Paginación
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        readings = [reading.to_dict() for reading in pagination.items]
-        
-        return jsonify({
-            'readings': readings,
-            'pagination': {
+        if 'page' in request.args:
+            # Paginación clásica (OFFSET + COUNT)
+            page = request.args.get('page', 1, type=int)
+            query = query.order_by(Reading.created_at.desc())
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            items = pagination.items
+            pagination_data = {
                 'page': page,
                 'per_page': per_page,
                 'total': pagination.total,
@@ -113,27 +151,174 @@ def get_readings():
                 'has_next': pagination.has_next,
                 'has_prev': pagination.has_prev
             }
-        }), 200
+        else:
+            try:
+                items, pagination_data = keyset_paginate(
+                    query,
+                    Reading,
+                    per_page,
+                    cursor=request.args.get('cursor'),
+                    include_total=request.args.get('include_total', '').lower() in ('1', 'true')
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        etag = compute_etag(
+            'readings', user_id, request.query_string,
+            [(reading.id, reading.updated_at) for reading in items],
+            pagination_data
+        )
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        if items:
+            # Resto de columnas de las lecturas de la página, en una consulta
+            # (completa las mismas instancias del mapa de identidad)
+            content = Reading.query.filter(Reading.id.in_([reading.id for reading in items]))
+            if fields:
+                content = content.options(Reading.load_only_fields(fields))
+            content.all()
+        
+        readings = [reading.to_dict(raw_json=True, fields=fields) for reading in items]
+        
+        return with_etag(json_response({
+            'readings': readings,
+            'pagination': pagination_data
+        }, 200), etag)
         
     except Exception as e:
         return jsonify({'error': 'Error al obtener lecturas', 'details': str(e)}), 500
 
 
+@reading_bp.route('/export', methods=['GET'])
+@login_required
+def export_readings():
+    """
+    Exporta todo el historial de lecturas como NDJSON (una lectura por línea)
+    
+    Las filas se leen por lotes (yield_per, cursor de servidor en PostgreSQL)
+    y se envían según se leen, así que la memoria no crece con el historial.
+    """
+    try:
+        user_id = current_user_id()
+        
+        stmt = select(Reading).where(Reading.user_id == user_id).order_by(
+            Reading.created_at, Reading.id
+        ).execution_options(yield_per=Config.EXPORT_BATCH_SIZE)
+        readings = db.session.scalars(stmt)
+        
+        return ndjson_response(
+            readings,
+            lambda reading: reading.to_dict(raw_json=True),
+            filename='readings.ndjson'
+        )
+        
+    except Exception as e:
+        return jsonify({'error': 'Error al exportar lecturas', 'details': str(e)}), 500
+
+
+# Errores de importación que se devuelven en detalle
+MAX_IMPORT_ERRORS = 50
+
+
+def _import_row(doc, user_id):
+    """Fila de Reading a partir de una línea importada; ValueError si no es válida"""
+    if not isinstance(doc, dict):
+        raise ValueError('Se esperaba un objeto JSON')
+    
+    spread_type = doc.get('spread_type')
+    cards = doc.get('cards')
+    if not spread_type or not isinstance(spread_type, str):
+        raise ValueError('Tipo de tirada requerido')
+    if not cards or not isinstance(cards, list):
+        raise ValueError('Cartas requeridas')
+    
+    for field in ('question', 'interpretation', 'notes'):
+        if doc.get(field) is not None and not isinstance(doc[field], str):
+            raise ValueError(f"'{field}' debe ser texto")
+    
+    created_at = doc.get('created_at')
+    created_at = datetime.fromisoformat(created_at) if created_at else datetime.utcnow()
+    
+    return {
+        'user_id': user_id,
+        'spread_type': spread_type,
+        'question': doc.get('question', ''),
+        'cards_data': json.dumps(cards, ensure_ascii=False),
+        'interpretation': doc.get('interpretation', ''),
+        'created_at': created_at,
+        'is_favorite': bool(doc.get('is_favorite', False)),
+        'notes': doc.get('notes')
+    }
+
+
+@reading_bp.route('/import', methods=['POST'])
+@login_required
+def import_readings():
+    """
+    Importa lecturas desde NDJSON (mismo formato que /export)
+    
+    El cuerpo se lee línea a línea y se inserta por lotes de IMPORT_CHUNK_SIZE
+    filas, confirmando cada lote. Los campos id y user_id se ignoran; las
+    líneas no válidas se omiten y se informan. Las lecturas importadas no
+    consumen el cupo diario.
+    """
+    try:
+        user_id = current_user_id()
+        errors = []
+        error_count = 0
+        
+        def valid_rows():
+            nonlocal error_count
+            for line_no, doc, error in read_ndjson(request.stream):
+                if error is None:
+                    try:
+                        yield _import_row(doc, user_id)
+                        continue
+                    except (TypeError, ValueError) as e:
+                        error = str(e)
+                error_count += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({'line': line_no, 'error': error})
+        
+        imported = 0
+        for chunk in chunked(valid_rows(), Config.IMPORT_CHUNK_SIZE):
+            db.session.execute(insert(Reading), chunk)
+            db.session.commit()
+            imported += len(chunk)
+        
+        if imported:
+            rebuild_user_stats(user_id)
+            db.session.commit()
+        
+        return jsonify({
+            'message': 'Importación completada',
+            'imported': imported,
+            'error_count': error_count,
+            'errors': errors
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error al importar lecturas', 'details': str(e)}), 500
+
+
 @reading_bp.route('/<int:reading_id>', methods=['GET'])
 @login_required
 def get_reading(reading_id):
     """Obtiene una lectura específica"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
         reading = Reading.query.filter_by(id=reading_id, user_id=user_id).first()
         
         if not reading:
             return jsonify({'error': 'Lectura no encontrada'}), 404
         
-        return jsonify({
-            'reading': reading.to_dict()
-        }), 200
+        return json_response({
+            'reading': reading.to_dict(raw_json=True)
+        }, 200)
         
     except Exception as e:
         return jsonify({'error': 'Error al obtener lectura', 'details': str(e)}), 500
@@ -144,7 +329,7 @@ def get_reading(reading_id):
 def update_reading(reading_id):
     """Actualiza una lectura (notas, favorito)"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
         reading = Reading.query.filter_by(id=reading_id, user_id=user_id).first()
         
@@ -157,8 +342,9 @@ def update_reading(reading_id):
         if 'notes' in data:
             reading.notes = data['notes']
         
-        if 'is_favorite' in data:
+        if 'is_favorite' in data and bool(data['is_favorite']) != bool(reading.is_favorite):
             reading.is_favorite = bool(data['is_favorite'])
+            record_favorite_changed(user_id, reading.is_favorite)
         
         db.session.commit()
         
@@ -177,7 +363,7 @@ def update_reading(reading_id):
 def delete_reading(reading_id):
     """Elimina una lectura"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
         reading = Reading.query.filter_by(id=reading_id, user_id=user_id).first()
         
@@ -185,6 +371,7 @@ def delete_reading(reading_id):
             return jsonify({'error': 'Lectura no encontrada'}), 404
         
         db.session.delete(reading)
+        record_reading_deleted(reading)
         db.session.commit()
         
         return jsonify({
@@ -201,7 +388,7 @@ def delete_reading(reading_id):
 def toggle_favorite(reading_id):
     """Marca/desmarca una lectura como favorita"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         
         reading = Reading.query.filter_by(id=reading_id, user_id=user_id).first()
         
@@ -209,6 +396,7 @@ def toggle_favorite(reading_id):
             return jsonify({'error': 'Lectura no encontrada'}), 404
         
         reading.is_favorite = not reading.is_favorite
+        record_favorite_changed(user_id, reading.is_favorite)
         db.session.commit()
         
         return jsonify({
@@ -227,8 +415,7 @@ def toggle_favorite(reading_id):
 def check_access():
     """Verifica si el usuario puede realizar una lectura"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_plan()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -2,9 +2,8 @@
 Rutas para gestión de suscripciones
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity
-from src.models import User, Subscription, db
-from src.auth import login_required
+from src.models import Subscription, db
+from src.auth import create_user_access_token, get_current_user, invalidate_entitlements, login_required
 from datetime import datetime, timedelta
 
 subscription_bp = Blueprint('subscription', __name__, url_prefix='/api/subscription')
@@ -57,8 +56,7 @@ def get_plans():
 def get_current_subscription():
     """Obtiene la suscripción actual del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -91,8 +89,7 @@ def upgrade_to_premium():
     En producción, aquí se integraría con Stripe/PayPal
     """
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -125,11 +122,14 @@ def upgrade_to_premium():
         
         db.session.add(subscription)
         db.session.commit()
+        invalidate_entitlements(user.id)
         
         return jsonify({
             'message': 'Actualización a Premium exitosa',
             'subscription': subscription.to_dict(),
-            'user': user.to_dict(include_email=True)
+            'user': user.to_dict(include_email=True),
+            # Token con los nuevos derechos; el anterior sigue siendo válido
+            'access_token': create_user_access_token(user)
         }), 200
         
     except Exception as e:
@@ -142,8 +142,7 @@ def upgrade_to_premium():
 def cancel_subscription():
     """Cancela la suscripción premium"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -165,6 +164,7 @@ def cancel_subscription():
         # Solo marcamos como cancelada para que no se renueve
         
         db.session.commit()
+        invalidate_entitlements(user.id)
         
         return jsonify({
             'message': 'Suscripción cancelada. Mantendrás acceso premium hasta el final del período actual.',
@@ -181,8 +181,7 @@ def cancel_subscription():
 def get_subscription_history():
     """Obtiene el historial de suscripciones del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -210,8 +209,7 @@ def demo_upgrade():
     SOLO PARA DESARROLLO - Eliminar en producción
     """
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -235,11 +233,14 @@ def demo_upgrade():
         
         db.session.add(subscription)
         db.session.commit()
+        invalidate_entitlements(user.id)
         
         return jsonify({
             'message': '¡Actualizado a Premium (DEMO)!',
             'subscription': subscription.to_dict(),
-            'user': user.to_dict(include_email=True)
+            'user': user.to_dict(include_email=True),
+            # Token con los nuevos derechos; el anterior sigue siendo válido
+            'access_token': create_user_access_token(user)
         }), 200
         
     except Exception as e:
@@ -2,12 +2,16 @@
 Rutas de usuario y configuraciones
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity
-from src.models import User, Reading, db
-from src.auth import login_required
+from sqlalchemy.exc import IntegrityError
+from src.models import User, db
+from src.auth import get_current_plan, get_current_user, login_required
 from src.middleware import FreemiumMiddleware
+from src.read_routing import route_reads_to_replica
+from src.reading_stats import get_reading_stats
 
 user_bp = Blueprint('user', __name__, url_prefix='/api/user')
+# Las consultas de las rutas GET van a la réplica de lectura (si hay)
+user_bp.before_request(route_reads_to_replica)
 
 
 @user_bp.route('/profile', methods=['GET'])
@@ -15,24 +19,22 @@ user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 def get_profile():
     """Obtiene el perfil completo del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
         # Obtener estadísticas
-        total_readings = Reading.query.filter_by(user_id=user.id).count()
-        favorite_readings = Reading.query.filter_by(user_id=user.id, is_favorite=True).count()
+        reading_stats = get_reading_stats(user.id)
         
         # Obtener uso actual
-        usage_stats = FreemiumMiddleware.get_usage_stats(user)
+        usage_stats = FreemiumMiddleware.get_usage_stats(get_current_plan())
         
         return jsonify({
             'user': user.to_dict(include_email=True),
             'stats': {
-                'total_readings': total_readings,
-                'favorite_readings': favorite_readings
+                'total_readings': reading_stats['total_readings'],
+                'favorite_readings': reading_stats['favorite_readings']
             },
             'usage': usage_stats
         }), 200
@@ -46,8 +48,7 @@ def get_profile():
 def update_settings():
     """Actualiza configuraciones del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -71,8 +72,8 @@ def update_settings():
             new_username = data['username'].strip()
             if new_username != user.username:
                 # Verificar que no esté en uso
-                existing = User.query.filter_by(username=new_username).first()
-                if existing:
+                existing = User.query.filter_by(username_lower=User.normalize_username(new_username)).first()
+                if existing and existing.id != user.id:
                     return jsonify({'error': 'Username ya está en uso'}), 409
                 user.username = new_username
         
@@ -83,6 +84,10 @@ def update_settings():
             'user': user.to_dict(include_email=True)
         }), 200
         
+    except IntegrityError:
+        # Otro usuario tomó el mismo username a la vez (índice único)
+        db.session.rollback()
+        return jsonify({'error': 'Username ya está en uso'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error al actualizar configuraciones', 'details': str(e)}), 500
@@ -93,8 +98,7 @@ def update_settings():
 def update_theme():
     """Actualiza solo el tema del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -123,8 +127,7 @@ def update_theme():
 def get_usage():
     """Obtiene estadísticas de uso del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_plan()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -142,38 +145,19 @@ def get_usage():
 def get_stats():
     """Obtiene estadísticas detalladas del usuario"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
-        # Estadísticas de lecturas
-        total_readings = Reading.query.filter_by(user_id=user.id).count()
-        favorite_readings = Reading.query.filter_by(user_id=user.id, is_favorite=True).count()
-        
-        # Lecturas por tipo de tirada
-        from sqlalchemy import func
-        spread_stats = db.session.query(
-            Reading.spread_type,
-            func.count(Reading.id).label('count')
-        ).filter_by(user_id=user.id).group_by(Reading.spread_type).all()
-        
-        spread_distribution = {spread: count for spread, count in spread_stats}
-        
-        # Lecturas recientes (últimos 7 días)
-        from datetime import datetime, timedelta
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_readings = Reading.query.filter(
-            Reading.user_id == user.id,
-            Reading.created_at >= seven_days_ago
-        ).count()
+        # Estadísticas de lecturas (fila precalculada)
+        reading_stats = get_reading_stats(user.id)
         
         return jsonify({
-            'total_readings': total_readings,
-            'favorite_readings': favorite_readings,
-            'recent_readings_7d': recent_readings,
-            'spread_distribution': spread_distribution,
+            'total_readings': reading_stats['total_readings'],
+            'favorite_readings': reading_stats['favorite_readings'],
+            'recent_readings_7d': reading_stats['recent_readings_7d'],
+            'spread_distribution': reading_stats['spread_distribution'],
             'member_since': user.created_at.isoformat(),
             'is_premium': user.is_premium()
         }), 200
@@ -1,36 +1,76 @@
 """
 Sistema de autenticación JWT
+
+La identidad se resuelve una sola vez por petición: el JWT se verifica en
+`login_required` y el usuario se carga como mucho una vez, bajo demanda, en
+`get_current_user()`. Ambos resultados se guardan en `flask.g` y los comparten
+todos los decoradores y vistas.
+
+Los derechos del plan viajan como claims en el token de acceso
+(src.entitlements), así que `get_current_plan()` no consulta la base de datos
+salvo para tokens antiguos o invalidados tras un cambio de suscripción.
 """
 from functools import wraps
-from flask import jsonify, request
+from flask import g, jsonify, request
 from flask_jwt_extended import (
-    JWTManager, 
-    create_access_token, 
+    JWTManager,
+    create_access_token,
     create_refresh_token,
     get_jwt_identity,
     verify_jwt_in_request,
     get_jwt
 )
+from src.cache import TTLCache
+from src.entitlements import Entitlements, claims_revision, entitlement_claims
+from src.login_tracker import last_login_tracker
 from src.models import User, db
-from datetime import datetime
+from src.token_revocation import token_revocation
+from config import Config
+import threading
 
 jwt = JWTManager()
 
+# Estado del plan por usuario compartido entre peticiones (TTL corto)
+plan_cache = TTLCache(maxsize=Config.PLAN_CACHE_SIZE, ttl=Config.PLAN_CACHE_TTL_SECONDS)
+
+# Revisión de derechos por usuario, que sube con cada cambio de suscripción:
+# los tokens emitidos con una revisión anterior dejan de usar sus claims. Un
+# contador y no una hora, porque `iat` tiene resolución de segundos y el token
+# nuevo se emite en el mismo segundo que el cambio. Basta con recordarla lo
+# que dura un token.
+entitlements_revision = TTLCache(
+    maxsize=Config.PLAN_CACHE_SIZE,
+    ttl=Config.JWT_ACCESS_TOKEN_EXPIRES.total_seconds()
+)
+_revision_lock = threading.Lock()
+
 
 def init_jwt(app):
     """Inicializa JWT con la app"""
     jwt.init_app(app)
-    
+
     @jwt.user_identity_loader
     def user_identity_lookup(user_id):
         """Define cómo se serializa la identidad del usuario"""
         return user_id
-    
-    @jwt.user_lookup_loader
-    def user_lookup_callback(_jwt_header, jwt_data):
-        """Carga el usuario desde el token"""
-        identity = jwt_data["sub"]
-        return User.query.filter_by(id=identity).first()
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        """Rechaza tokens revocados (filtro de Bloom en memoria, ver src.token_revocation)"""
+        return token_revocation.is_revoked(jwt_payload['jti'])
+
+
+def current_user_id():
+    """
+    Id (int) del usuario autenticado en la petición actual
+
+    Verifica el JWT solo si ningún decorador lo hizo antes en esta petición.
+    """
+    if 'current_user_id' not in g:
+        verify_jwt_in_request()
+        user_id = get_jwt_identity()
+        g.current_user_id = int(user_id) if user_id is not None else None
+    return g.current_user_id
 
 
 def login_required(fn):
@@ -40,8 +80,7 @@ def login_required(fn):
         verify_jwt_in_request()
         # Convertir identity a int si es string
         user_id = get_jwt_identity()
-        if isinstance(user_id, str):
-            user_id = int(user_id)
+        g.current_user_id = int(user_id) if user_id is not None else None
         return fn(*args, **kwargs)
     return wrapper
 
@@ -51,47 +90,115 @@ def premium_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
         try:
-            verify_jwt_in_request()
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            
-            if not user:
+            plan = get_current_plan()
+
+            if not plan:
                 return jsonify({'error': 'Usuario no encontrado'}), 404
-            
-            if not user.is_premium():
+
+            if not plan.is_premium():
                 return jsonify({
                     'error': 'Se requiere suscripción premium',
                     'upgrade_required': True,
-                    'current_plan': user.subscription_plan
+                    'current_plan': plan.subscription_plan
                 }), 403
-            
+
             return fn(*args, **kwargs)
         except Exception as e:
             return jsonify({'error': 'Error de autenticación', 'message': str(e)}), 401
     return wrapper
 
 
+def create_user_access_token(user):
+    """Token de acceso con los derechos actuales del usuario como claims"""
+    revision = entitlements_revision.get(user.id, 0)
+    return create_access_token(identity=str(user.id), additional_claims=entitlement_claims(user, revision))
+
+
 def create_tokens(user):
-    """Crea tokens de acceso y refresh para un usuario"""
-    # Actualizar último login
-    user.last_login = datetime.utcnow()
-    db.session.commit()
+    """
+    Crea tokens de acceso y refresh para un usuario
     
-    access_token = create_access_token(identity=str(user.id))
+    No escribe en la base de datos: el último login se registra en el buffer
+    de src.login_tracker y se vuelca por lotes.
+    """
+    last_login = last_login_tracker.record(user)
+
+    access_token = create_user_access_token(user)
     refresh_token = create_refresh_token(identity=str(user.id))
-    
+
+    user_data = user.to_dict(include_email=True)
+    user_data['last_login'] = last_login.isoformat()
+
     return {
         'access_token': access_token,
         'refresh_token': refresh_token,
-        'user': user.to_dict(include_email=True)
+        'user': user_data
     }
 
 
 def get_current_user():
-    """Obtiene el usuario actual desde el token JWT"""
+    """Obtiene el usuario actual desde el token JWT (una consulta por petición)"""
+    if '_current_user' in g:
+        return g._current_user
+
     try:
-        verify_jwt_in_request()
-        user_id = get_jwt_identity()
-        return User.query.get(user_id)
+        user_id = current_user_id()
     except:
         return None
+
+    user = db.session.get(User, user_id) if user_id is not None else None
+    g._current_user = user
+    return user
+
+
+def _plan_from_token(user_id):
+    """Derechos desde los claims del token, si los trae y siguen vigentes"""
+    claims = get_jwt()
+    if claims_revision(claims) < entitlements_revision.get(user_id, 0):
+        return None
+    return Entitlements.from_claims(user_id, claims)
+
+
+def get_current_plan():
+    """
+    Derechos del plan del usuario actual
+    
+    Se toman de los claims del token de acceso; si no están (token antiguo)
+    o se invalidaron, de la caché entre peticiones o, en último caso, del
+    usuario (cargado una vez por petición).
+    """
+    if '_current_plan' in g:
+        return g._current_plan
+    
+    try:
+        user_id = current_user_id()
+    except:
+        return None
+    
+    plan = _plan_from_token(user_id)
+    if plan is None:
+        plan = plan_cache.get(user_id)
+    if plan is None:
+        user = get_current_user()
+        if not user:
+            return None
+        plan = Entitlements.from_user(user)
+        plan_cache.set(user_id, plan)
+    
+    g._current_plan = plan
+    return plan
+
+
+def invalidate_entitlements(user_id):
+    """
+    Descarta los derechos cacheados tras cambiar la suscripción del usuario
+    
+    En este proceso los tokens emitidos antes del cambio vuelven a consultar
+    el plan; en otros procesos los claims antiguos duran hasta que el cliente
+    use el nuevo token de acceso (devuelto por upgrade) o refresque el suyo.
+    """
+    user_id = int(user_id)
+    plan_cache.delete(user_id)
+    with _revision_lock:
+        entitlements_revision.set(user_id, entitlements_revision.get(user_id, 0) + 1)
+    g.pop('_current_plan', None)
@@ -0,0 +1,99 @@
+"""
+Comandos de mantenimiento para la CLI de Flask (`flask --app app <comando>`)
+"""
+import click
+
+
+def register_commands(app):
+    """Registra los comandos de mantenimiento en la app"""
+
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema():
+        """Crea las tablas que falten y aplica las actualizaciones de esquema"""
+        from src.models import db
+        from src.schema_upgrades import SchemaUpgradeError, run_upgrades
+
+        db.create_all()
+        try:
+            applied = run_upgrades()
+        except SchemaUpgradeError as e:
+            raise click.ClickException(str(e))
+        if applied:
+            for change in applied:
+                click.echo(f"✅ {change}")
+        else:
+            click.echo("✅ El esquema ya está actualizado")
+
+    @app.cli.command('rebuild-reading-stats')
+    @click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario')
+    def rebuild_reading_stats(user_id):
+        """Recalcula user_reading_stats desde la tabla de lecturas"""
+        from src.models import db
+        from src.reading_stats import rebuild_all_stats, rebuild_user_stats
+
+        if user_id is not None:
+            rebuild_user_stats(user_id)
+            db.session.commit()
+            click.echo(f"✅ Estadísticas del usuario {user_id} reconstruidas")
+        else:
+            click.echo(f"✅ Estadísticas reconstruidas para {rebuild_all_stats()} usuarios")
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Falla si alguna consulta de las rutas principales recorre una tabla completa"""
+        from src.query_plans import check_query_plans
+
+        failed = 0
+        for result in check_query_plans():
+            status = '❌' if result['full_scans'] else '✅'
+            click.echo(f"{status} {result['name']} ({result['route']}): {' | '.join(result['plan'])}")
+            if result['full_scans']:
+                failed += 1
+
+        if failed:
+            raise click.ClickException(f"{failed} consulta(s) con recorrido completo de tabla")
+
+    @app.cli.command('purge-revoked-tokens')
+    def purge_revoked_tokens():
+        """Borra de revoked_tokens las revocaciones de tokens ya expirados"""
+        from src.token_revocation import token_revocation
+
+        click.echo(f"✅ {token_revocation.purge_expired()} revocaciones expiradas eliminadas")
+
+    @app.cli.command('import-profile')
+    @click.option('--module', default='api.index', help='Módulo de entrada a importar')
+    @click.option('--top', type=int, default=25, help='Número de módulos a mostrar')
+    def import_profile(module, top):
+        """Módulos que más tardan en importarse (python -X importtime)"""
+        from src.startup_profile import profile_imports
+
+        profile = profile_imports(module, top)
+        click.echo(f"{profile['module']}: {profile['total_ms']:.1f} ms")
+        for entry in profile['modules']:
+            click.echo(f"{entry['cumulative_ms']:10.1f} ms {entry['self_ms']:10.1f} ms  {entry['module']}")
+
+    @app.cli.command('cold-start-benchmark')
+    @click.option('--module', default='api.index', help='Módulo de entrada (debe exponer `app`)')
+    @click.option('--runs', type=int, default=5, help='Intérpretes nuevos a medir')
+    @click.option('--budget-ms', type=float, default=None, help='Por defecto COLD_START_BUDGET_MS')
+    def cold_start_benchmark(module, runs, budget_ms):
+        """Falla si el arranque en frío supera el presupuesto o carga módulos diferidos"""
+        from src.startup_profile import format_cold_start, measure_cold_start
+
+        report = measure_cold_start(module, runs, budget_ms)
+        for line in format_cold_start(report):
+            click.echo(line)
+        if not report['within_budget']:
+            raise click.ClickException('Arranque en frío fuera de presupuesto')
+
+    @app.cli.command('check-undefined-names')
+    def check_undefined_names():
+        """Falla si alguna función usa un nombre que su módulo no define ni importa"""
+        from src.startup_profile import find_undefined_names, format_undefined_names
+
+        undefined = find_undefined_names()
+        for line in format_undefined_names(undefined):
+            click.echo(line)
+        if undefined:
+            raise click.ClickException(f'{len(undefined)} nombres no definidos')
+        click.echo('Sin nombres no definidos')
@@ -0,0 +1,97 @@
+"""
+Compresión de respuestas según Accept-Encoding
+El historial de lecturas y las cartas natales son JSON grande y muy repetitivo
+(textos en español, datos de la carta, interpretaciones). Las respuestas de
+tipo texto a partir de COMPRESS_MIN_SIZE bytes se comprimen con brotli o gzip,
+la que prefiera el cliente. Brotli es opcional: sin el paquete `brotli`
+instalado solo se ofrece gzip.
+
+Las respuestas en streaming (NDJSON) y los archivos estáticos no se tocan.
+"""
+from typing import Optional
+import gzip
+from flask import request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json',
+    'application/javascript',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain'
+})
+
+
+def available_encodings():
+    """Codificaciones soportadas, de mayor a menor preferencia del servidor"""
+    return ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """
+    Codificación con mayor calidad en Accept-Encoding, o None
+
+    Con calidades iguales gana brotli (más compacto para texto).
+    """
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    # mtime=0: el mismo cuerpo produce siempre los mismos bytes
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def init_compression(app):
+    """Registra el after_request que comprime las respuestas (si RESPONSE_COMPRESSION)"""
+    if not app.config.get('RESPONSE_COMPRESSION', True):
+        return
+
+    min_size = int(app.config.get('COMPRESS_MIN_SIZE', 1024))
+    gzip_level = int(app.config.get('COMPRESS_GZIP_LEVEL', 6))
+    brotli_quality = int(app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            request.method == 'HEAD'
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        # La respuesta depende de Accept-Encoding aunque esta vaya sin comprimir
+        response.vary.add('Accept-Encoding')
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        body = compress(data, encoding, gzip_level, brotli_quality)
+        if len(body) >= len(data):
+            return response
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
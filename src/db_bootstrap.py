@@ -0,0 +1,94 @@
+"""
+Inicialización única de la base de datos
+`db.create_all()` se ejecuta una sola vez por proceso, protegido por un lock.
+Si falla, los reintentos se espacian con backoff exponencial en lugar de
+repetirse en cada petición; una vez inicializada, la comprobación por petición
+es la lectura de un atributo.
+"""
+from typing import Callable, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseInitializer:
+    """
+    Ejecuta `init_fn` hasta que tenga éxito, con backoff entre intentos
+
+    Se inicializa como las extensiones de Flask (`database_initializer.init_app(app)`):
+    intenta inicializar al arrancar y, solo si falla, registra un hook que
+    reintenta respetando el backoff.
+    """
+
+    def __init__(self, init_fn: Optional[Callable[[], None]] = None,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.app = None
+        self.init_fn = init_fn
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.initialized = False
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, init_fn: Optional[Callable[[], None]] = None):
+        """Intenta inicializar ya; si falla, reintenta desde before_request"""
+        from src.models import db
+
+        self.app = app
+        self.base_delay = app.config.get('DB_INIT_RETRY_BASE_SECONDS', self.base_delay)
+        self.max_delay = app.config.get('DB_INIT_RETRY_MAX_SECONDS', self.max_delay)
+        if init_fn is not None:
+            self.init_fn = init_fn
+        elif self.init_fn is None:
+            self.init_fn = db.create_all
+
+        if self.ensure():
+            return
+
+        @app.before_request
+        def retry_database_initialization():
+            if not self.initialized:
+                self.ensure()
+
+    def ensure(self) -> bool:
+        """Inicializa si aún no se hizo y toca reintentar; devuelve si está inicializada"""
+        if self.initialized:
+            return True
+        if time.monotonic() < self._next_attempt:
+            return False
+        if not self._lock.acquire(blocking=False):
+            # Otro hilo está inicializando: esta petición no espera
+            return False
+
+        try:
+            if self.initialized or time.monotonic() < self._next_attempt:
+                return self.initialized
+            self.attempts += 1
+            try:
+                with self.app.app_context():
+                    self.init_fn()
+            except Exception as e:
+                delay = min(self.max_delay, self.base_delay * 2 ** (self.attempts - 1))
+                self._next_attempt = time.monotonic() + delay
+                self.last_error = str(e)
+                logger.error("❌ Database initialization failed (intento %d, reintento en %.1fs): %s",
+                             self.attempts, delay, e)
+                return False
+
+            self.initialized = True
+            self.last_error = None
+            logger.info("✅ Database initialized")
+            return True
+        finally:
+            self._lock.release()
+
+    def status(self):
+        """Estado para health checks"""
+        return {'initialized': self.initialized, 'attempts': self.attempts, 'last_error': self.last_error}
+
+
+database_initializer = DatabaseInitializer()
@@ -0,0 +1,232 @@
+"""
+Perfiles del motor de base de datos y telemetría del pool
+Cada destino de despliegue usa un pool distinto:
+
+- serverless: sin pool (NullPool); cada invocación abre su conexión y la
+  cierra, sin conexiones ociosas retenidas entre congelaciones de la instancia.
+- single: un proceso (gunicorn con hilos) con pool amplio; sin pre-ping, las
+  conexiones se reciclan cada 30 minutos.
+- multi_worker: varios procesos; pool pequeño por proceso para no agotar las
+  conexiones del servidor, LIFO para que las ociosas caduquen, y pre-ping
+  porque suelen pasar por un balanceador o pgbouncer que corta las ociosas.
+
+En SQLite (archivo) se aplican además pragmas al conectar: WAL,
+synchronous=NORMAL, mmap y busy_timeout, para que los lectores no bloqueen al
+escritor y los escritores esperen en lugar de fallar con "database is locked".
+"""
+from typing import Dict, Optional
+import sqlite3
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+
+PROFILES: Dict[str, Dict] = {
+    'serverless': {
+        'poolclass': 'null',
+        'pool_pre_ping': False
+    },
+    'single': {
+        'poolclass': 'queue',
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': False
+    },
+    'multi_worker': {
+        'poolclass': 'queue',
+        'pool_size': 2,
+        'max_overflow': 4,
+        'pool_timeout': 10,
+        'pool_recycle': 300,
+        'pool_pre_ping': True,
+        'pool_use_lifo': True
+    }
+}
+
+
+class PoolMetrics:
+    """Contadores de uso del pool de conexiones (todas las instancias del proceso)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.overflow_max = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False, overflow: Optional[int] = None):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            if overflow is not None:
+                self.overflow_max = max(self.overflow_max, overflow)
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool: Optional[Pool] = None) -> Dict:
+        """Contadores acumulados y, si se pasa el pool, su estado actual"""
+        with self._lock:
+            data = {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'overflow_max': self.overflow_max
+            }
+        if pool is not None:
+            data['pool'] = type(pool).__name__
+            if isinstance(pool, QueuePool):
+                data.update({
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'idle': pool.checkedin(),
+                    'overflow': pool.overflow()
+                })
+        return data
+
+
+pool_metrics = PoolMetrics()
+
+
+class _TimedCheckoutMixin:
+    """Mide cuánto espera cada checkout (incluye abrir conexiones nuevas)"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        overflow = self.overflow() if isinstance(self, QueuePool) else None
+        pool_metrics.record_wait(time.perf_counter() - started, overflow=overflow)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckoutMixin, NullPool):
+    pass
+
+
+_POOL_CLASSES = {'queue': InstrumentedQueuePool, 'null': InstrumentedNullPool}
+
+
+def resolve_profile(name: str, is_serverless: bool = False) -> str:
+    """Nombre de perfil efectivo ('auto' elige serverless o single)"""
+    name = (name or 'auto').strip().lower()
+    if name == 'auto':
+        return 'serverless' if is_serverless else 'single'
+    if name not in PROFILES:
+        raise ValueError(f"DB_PROFILE desconocido: {name} (opciones: auto, {', '.join(PROFILES)})")
+    return name
+
+
+def engine_options(uri: str, profile: str) -> Dict:
+    """
+    Opciones de create_engine para la URI y el perfil dados
+
+    SQLite en memoria conserva el pool por defecto (una única conexión
+    compartida); en SQLite de archivo no se usa pre-ping.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+
+    options = dict(PROFILES[profile])
+    options['poolclass'] = _POOL_CLASSES[options['poolclass']]
+    if options['poolclass'] is InstrumentedNullPool:
+        options = {key: value for key, value in options.items() if key in ('poolclass', 'pool_pre_ping')}
+    if url.get_backend_name() == 'sqlite':
+        options['pool_pre_ping'] = False
+    return options
+
+
+def sqlite_pragmas(config) -> Dict[str, object]:
+    """Pragmas a aplicar a cada conexión SQLite nueva"""
+    return {
+        'journal_mode': config.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(config.get('SQLITE_MMAP_SIZE', 268435456)),
+        'busy_timeout': int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    }
+
+
+class DatabaseProfile:
+    """
+    Aplica el perfil DB_PROFILE a la app
+
+    Debe llamarse antes de `db.init_app(app)`, que es cuando Flask-SQLAlchemy
+    crea el motor. Las opciones definidas explícitamente en
+    SQLALCHEMY_ENGINE_OPTIONS tienen prioridad sobre las del perfil.
+    """
+
+    def __init__(self):
+        self.profile = None
+        self.pragmas: Dict[str, object] = {}
+        self._listeners_installed = False
+
+    def init_app(self, app):
+        self.profile = resolve_profile(app.config.get('DB_PROFILE', 'auto'), app.config.get('IS_VERCEL', False))
+        options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], self.profile)
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        self.pragmas = sqlite_pragmas(app.config)
+        self._install_listeners()
+
+    def _install_listeners(self):
+        if self._listeners_installed:
+            return
+        self._listeners_installed = True
+
+        @event.listens_for(Pool, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            pool_metrics.incr('connects')
+            if isinstance(dbapi_connection, sqlite3.Connection) and self.pragmas:
+                cursor = dbapi_connection.cursor()
+                for name, value in self.pragmas.items():
+                    cursor.execute(f'PRAGMA {name}={value}')
+                cursor.close()
+
+        @event.listens_for(Pool, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            pool_metrics.incr('checkouts')
+
+        @event.listens_for(Pool, 'checkin')
+        def on_checkin(dbapi_connection, connection_record):
+            pool_metrics.incr('checkins')
+
+        @event.listens_for(Pool, 'invalidate')
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            pool_metrics.incr('invalidations')
+
+    def metrics(self, engine) -> Dict:
+        """Perfil activo y telemetría del pool del motor dado"""
+        return {
+            'profile': self.profile,
+            'dialect': engine.dialect.name,
+            **pool_metrics.snapshot(engine.pool)
+        }
+
+
+database_profile = DatabaseProfile()
@@ -0,0 +1,84 @@
+"""
+Derechos del plan del usuario (entitlements)
+Instantánea de plan, vencimiento, tiradas permitidas y límite diario que se
+calcula una vez y viaja como claim del token de acceso, de modo que la
+autorización de la mayoría de peticiones no necesita la base de datos.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+from config import Config
+
+# Nombre del claim en el token de acceso
+CLAIM = 'ent'
+CLAIM_VERSION = 1
+
+
+class Entitlements:
+    """
+    Instantánea del plan de un usuario
+
+    Expone lo que necesitan las comprobaciones freemium (`id`,
+    `subscription_plan`, `is_premium()`, tiradas y límite) sin mantener una
+    fila ORM viva. El estado premium se evalúa una sola vez, al construirla.
+    """
+    __slots__ = ('id', 'subscription_plan', 'subscription_end', 'premium', 'allowed_spreads', 'daily_limit')
+
+    def __init__(self, user_id: int, subscription_plan: str, subscription_end: Optional[datetime],
+                 now: Optional[datetime] = None):
+        self.id = user_id
+        self.subscription_plan = subscription_plan
+        self.subscription_end = subscription_end
+
+        # Misma regla que User.is_premium
+        now = now or datetime.utcnow()
+        self.premium = subscription_plan == 'premium' and not (subscription_end and subscription_end < now)
+
+        self.allowed_spreads: Union[str, List[str]] = 'all' if self.premium else list(Config.FREE_ALLOWED_SPREADS)
+        self.daily_limit = -1 if self.premium else Config.FREE_DAILY_READINGS
+
+    @classmethod
+    def from_user(cls, user) -> 'Entitlements':
+        return cls(user.id, user.subscription_plan, user.subscription_end)
+
+    def is_premium(self) -> bool:
+        return self.premium
+
+    def can_use_spread(self, spread_type: str) -> bool:
+        return self.allowed_spreads == 'all' or spread_type in self.allowed_spreads
+
+    def to_claims(self, revision: int = 0) -> Dict:
+        """
+        Claims para additional_claims de create_access_token
+
+        `revision` es la revisión de derechos del usuario al emitir el token
+        (ver src.auth.invalidate_entitlements).
+        """
+        until = None
+        if self.subscription_end:
+            until = int(self.subscription_end.replace(tzinfo=timezone.utc).timestamp())
+        return {CLAIM: {'v': CLAIM_VERSION, 'plan': self.subscription_plan, 'until': until, 'rev': revision}}
+
+    @classmethod
+    def from_claims(cls, user_id: int, claims: Dict) -> Optional['Entitlements']:
+        """Instantánea a partir de los claims del token, o None si no los trae"""
+        data = claims.get(CLAIM)
+        if not isinstance(data, dict) or data.get('v') != CLAIM_VERSION:
+            return None
+
+        until = data.get('until')
+        subscription_end = (
+            datetime.fromtimestamp(until, tz=timezone.utc).replace(tzinfo=None)
+            if until is not None else None
+        )
+        return cls(user_id, data.get('plan') or 'free', subscription_end)
+
+
+def claims_revision(claims: Dict) -> int:
+    """Revisión de derechos con la que se emitió un token (0 si no la trae)"""
+    data = claims.get(CLAIM)
+    return data.get('rev', 0) if isinstance(data, dict) else 0
+
+
+def entitlement_claims(user, revision: int = 0) -> Dict:
+    """Claims de derechos de un usuario para incluir en su token de acceso"""
+    return Entitlements.from_user(user).to_claims(revision)
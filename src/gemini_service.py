@@ -1,64 +1,175 @@
 """
 Servicio de integración con Google Gemini AI
 Para interpretaciones astrológicas personalizadas
+
+El proveedor de texto es intercambiable (ver src/interpretation_backends.py):
+Gemini en producción o un stub local para pruebas de carga.
 """
-import google.generativeai as genai
 from typing import Dict, List, Optional
-import os
+import json
+import logging
+import threading
 from config import Config
+from src.interpretation_backends import InterpretationBackend, create_backend, is_retryable_error
+from src.rate_limiter import LimiterTimeout, RateLimitedCaller
+from src.single_flight import SingleFlight, normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Límite de salida para la lectura en un solo prompt (varias secciones)
+BATCHED_MAX_OUTPUT_TOKENS = 8192
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+# Peticiones idénticas en curso (picos de horóscopo diario, ascendentes comunes)
+_single_flight = SingleFlight()
+
+
+class InterpretationError(Exception):
+    """No se pudo obtener una interpretación del servicio de IA"""
+
+
+class MalformedResponseError(InterpretationError):
+    """
+    El modelo respondió, pero sin un objeto JSON utilizable
+
+    Es el único fallo de la lectura en lote que justifica repetirla sección a
+    sección: la saturación del limitador y los errores del backend se
+    propagan, porque repartir la lectura en más llamadas los agravaría.
+    """
+
+
+def parse_sections_json(text: str, keys: List[str]) -> Dict[str, str]:
+    """
+    Extrae las secciones de una respuesta JSON del modelo
+    
+    Tolera bloques de código markdown y texto alrededor del objeto. Solo se
+    devuelven las claves pedidas cuyo valor sea un texto no vacío.
+    
+    Raises:
+        MalformedResponseError: si no hay un objeto JSON interpretable
+    """
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end <= start:
+        raise MalformedResponseError("La respuesta no contiene un objeto JSON")
+    
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise MalformedResponseError(f"JSON inválido en la respuesta: {e}") from e
+    
+    if not isinstance(data, dict):
+        raise MalformedResponseError("La respuesta JSON no es un objeto")
+    
+    return {
+        key: data[key].strip()
+        for key in keys
+        if isinstance(data.get(key), str) and data[key].strip()
+    }
+
+
+def get_gemini_limiter() -> RateLimitedCaller:
+    """Limitador compartido por todas las instancias del servicio en el proceso"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimitedCaller(
+                    rate=Config.GEMINI_RATE_LIMIT_PER_SECOND,
+                    burst=Config.GEMINI_BURST,
+                    initial_concurrency=Config.GEMINI_INITIAL_CONCURRENCY,
+                    max_concurrency=Config.GEMINI_MAX_CONCURRENCY,
+                    latency_target=Config.GEMINI_LATENCY_TARGET_SECONDS,
+                    max_retries=Config.GEMINI_MAX_RETRIES,
+                    acquire_timeout=Config.GEMINI_ACQUIRE_TIMEOUT_SECONDS,
+                    is_retryable=is_retryable_error
+                )
+    return _limiter
+
+
+def get_interpretation_metrics() -> Dict:
+    """Métricas del limitador y de la deduplicación de llamadas en curso"""
+    metrics = get_gemini_limiter().metrics()
+    metrics['single_flight'] = _single_flight.metrics()
+    return metrics
 
 
 class GeminiAstrologyService:
     """Servicio para generar interpretaciones astrológicas usando Gemini AI"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        backend: Optional[InterpretationBackend] = None,
+        limiter: Optional[RateLimitedCaller] = None
+    ):
         """
         Inicializa el servicio de Gemini
         
         Args:
             api_key: Clave API de Google Gemini (opcional, usa variable de entorno si no se proporciona)
+            backend: Backend de generación (opcional, por defecto Config.INTERPRETATION_BACKEND)
+            limiter: Limitador propio (p. ej. para procesos por lotes); por
+                defecto el compartido si el backend tiene cuota
+        
+        Raises:
+            ValueError: si el backend configurado no puede inicializarse
         """
-        self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
+        self.backend = backend or create_backend(api_key=api_key)
+        # Los backends locales (stub) no consumen la cuota de Gemini
+        if limiter is None and self.backend.rate_limited:
+            limiter = get_gemini_limiter()
+        self.limiter = limiter
+    
+    def _generate(
+        self,
+        prompt: str,
+        max_output_tokens: Optional[int] = None,
+        json_keys: Optional[List[str]] = None
+    ) -> str:
+        """
+        Envía un prompt al backend a través del limitador compartido (si el
+        backend tiene cuota)
         
-        if not self.api_key:
-            raise ValueError(
-                "GEMINI_API_KEY no configurada. "
-                "Proporciona la clave en el constructor o como variable de entorno."
-            )
+        Las llamadas concurrentes con el mismo prompt normalizado esperan a
+        una única llamada en curso en lugar de lanzar la suya.
         
-        # Configurar Gemini
-        genai.configure(api_key=self.api_key)
+        Args:
+            prompt: Texto del prompt
+            max_output_tokens: Límite de salida si difiere del configurado
+            json_keys: Claves esperadas si el prompt pide un objeto JSON
+        
+        Raises:
+            MalformedResponseError: si la respuesta no contiene texto
+            InterpretationError: si el limitador está saturado o la llamada
+                falla tras los reintentos. Nunca se devuelve el error como texto.
+        """
+        def call():
+            return self.backend.generate(
+                prompt,
+                max_output_tokens=max_output_tokens,
+                json_keys=json_keys
+            )
         
-        # Usar el modelo Gemini Pro
-        self.model = genai.GenerativeModel('gemini-pro')
+        key = normalize_key(prompt, self.backend.name, max_output_tokens, json_keys)
         
-        # Configuración de generación
-        self.generation_config = {
-            'temperature': 0.7,  # Balance entre creatividad y coherencia
-            'top_p': 0.8,
-            'top_k': 40,
-            'max_output_tokens': 2048,
-        }
+        try:
+            text = _single_flight.do(key, lambda: self.limiter.call(call) if self.limiter is not None else call())
+        except LimiterTimeout as e:
+            raise InterpretationError(f"Servicio de interpretación saturado: {e}") from e
+        except Exception as e:
+            logger.warning("Backend '%s' falló: %s: %s", self.backend.name, type(e).__name__, e)
+            raise InterpretationError(f"Error al generar interpretación: {e}") from e
         
-        # Configuración de seguridad (permitir contenido astrológico)
-        self.safety_settings = [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_NONE"
-            },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_NONE"
-            }
-        ]
+        if not text or not text.strip():
+            raise MalformedResponseError("El backend devolvió una respuesta vacía")
+        return text
+    
+    def get_metrics(self) -> Dict:
+        """Métricas del limitador compartido y de la deduplicación"""
+        return get_interpretation_metrics()
     
     def interpret_house_placement(
         self,
@@ -95,15 +206,7 @@ Incluye en tu interpretación:
 
 Escribe en español, de forma clara, empática y profesional. Máximo 200 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al generar interpretación: {str(e)}"
+        return self._generate(prompt)
     
     def interpret_aspect(
         self,
@@ -151,15 +254,7 @@ Proporciona una interpretación que incluya:
 
 Escribe en español, de forma clara y constructiva. Máximo 180 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al generar interpretación: {str(e)}"
+        return self._generate(prompt)
     
     def interpret_ascendant(self, sign: str, degree: float) -> str:
         """
@@ -187,15 +282,7 @@ Proporciona una interpretación que incluya:
 
 Escribe en español, de forma inspiradora y práctica. Máximo 200 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al generar interpretación: {str(e)}"
+        return self._generate(prompt)
     
     def interpret_midheaven(self, sign: str, degree: float) -> str:
         """
@@ -223,15 +310,47 @@ Proporciona una interpretación que incluya:
 
 Escribe en español, de forma motivadora y práctica. Máximo 200 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al generar interpretación: {str(e)}"
+        return self._generate(prompt)
+    
+    def interpret_tarot_position(
+        self,
+        card_name: str,
+        invertida: bool,
+        significado: str,
+        palabras_clave: List[str],
+        spread_name: str,
+        position: str
+    ) -> str:
+        """
+        Interpreta una carta de tarot en una posición concreta de una tirada
+        
+        Args:
+            card_name: Nombre de la carta
+            invertida: Si la carta aparece invertida
+            significado: Significado base según la orientación
+            palabras_clave: Palabras clave de la carta
+            spread_name: Nombre de la tirada
+            position: Nombre de la posición dentro de la tirada
+        
+        Returns:
+            Interpretación textual
+        """
+        orientacion = "invertida" if invertida else "derecha"
+        
+        prompt = f"""Como tarotista experto, interpreta esta carta en su posición:
+
+Tirada: {spread_name}
+Posición: {position}
+Carta: {card_name} ({orientacion})
+Significado base: {significado}
+Palabras clave: {', '.join(palabras_clave)}
+
+Explica qué revela esta carta en esta posición concreta de la tirada y ofrece
+un consejo breve. No menciones otras cartas.
+
+Escribe en español, en segunda persona, de forma empática. Máximo 80 palabras."""
+
+        return self._generate(prompt)
     
     def generate_birth_chart_summary(
         self,
@@ -282,15 +401,7 @@ Proporciona un análisis que incluya:
 
 Escribe en español, de forma empática, inspiradora y práctica. Máximo 400 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al generar resumen: {str(e)}"
+        return self._generate(prompt)
     
     def interpret_house_system(self, house_system: str) -> str:
         """
@@ -321,15 +432,7 @@ Escribe en español, de forma empática, inspiradora y práctica. Máximo 400 pa
 
 Escribe en español, de forma clara y educativa. Máximo 150 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Sistema de casas: {system_name}"
+        return self._generate(prompt)
     
     def interpret_multiple_aspects(self, aspects: List[Dict], limit: int = 5) -> str:
         """
@@ -366,20 +469,13 @@ Proporciona:
 
 Escribe en español, de forma sintética y práctica. Máximo 300 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al generar interpretación de aspectos: {str(e)}"
+        return self._generate(prompt)
     
     def generate_personalized_reading(
         self,
         chart_data: Dict,
-        question: Optional[str] = None
+        question: Optional[str] = None,
+        mode: Optional[str] = None
     ) -> Dict[str, str]:
         """
         Genera una lectura astrológica completa y personalizada
@@ -387,45 +483,139 @@ Escribe en español, de forma sintética y práctica. Máximo 300 palabras."""
         Args:
             chart_data: Datos completos de la carta natal
             question: Pregunta específica del usuario (opcional)
+            mode: 'batched' (un único prompt con salida JSON por secciones) o
+                'sections' (una llamada por sección). Por defecto
+                Config.GEMINI_INTERPRETATION_MODE
         
         Returns:
-            Diccionario con diferentes secciones interpretadas
+            Diccionario con diferentes secciones interpretadas. Las secciones
+            que fallan se omiten en lugar de guardarse como texto de error.
+        
+        Raises:
+            InterpretationError: si no se pudo generar ninguna sección, o si en
+                modo 'batched' el servicio está saturado o el backend falla
         """
-        interpretations = {}
+        sections = self._reading_sections(chart_data, question)
+        mode = mode or Config.GEMINI_INTERPRETATION_MODE
         
-        # Interpretar Ascendente
+        interpretations = {}
+        if mode == 'batched':
+            try:
+                interpretations = self._generate_batched_reading(chart_data, question, [k for k, _ in sections])
+            except MalformedResponseError as e:
+                # Solo una respuesta ilegible; la saturación y los errores del
+                # backend se propagan sin multiplicar las llamadas
+                logger.warning("Lectura en lote no válida, se usan llamadas por sección: %s", e)
+        
+        # Secciones pendientes (modo 'sections' o las que faltaron en el lote)
+        last_error = None
+        for key, generate in sections:
+            if key in interpretations:
+                continue
+            try:
+                interpretations[key] = generate()
+            except InterpretationError as e:
+                logger.warning("Sección '%s' sin interpretación: %s", key, e)
+                last_error = e
+        
+        if not interpretations:
+            raise InterpretationError(str(last_error) if last_error else "Sin interpretaciones")
+        
+        # Mantener el orden de secciones independientemente del origen
+        return {key: interpretations[key] for key, _ in sections if key in interpretations}
+    
+    def _reading_sections(self, chart_data: Dict, question: Optional[str]) -> List:
+        """Secciones de la lectura personalizada con su generador individual"""
         asc = chart_data['houses']['ascendant']
-        interpretations['ascendant'] = self.interpret_ascendant(
-            asc['sign'],
-            asc['degree_in_sign']
-        )
-        
-        # Interpretar Medio Cielo
         mc = chart_data['houses']['midheaven']
-        interpretations['midheaven'] = self.interpret_midheaven(
-            mc['sign'],
-            mc['degree_in_sign']
-        )
+        aspects = chart_data.get('aspects', [])
+        
+        sections = [
+            ('ascendant', lambda: self.interpret_ascendant(asc['sign'], asc['degree_in_sign'])),
+            ('midheaven', lambda: self.interpret_midheaven(mc['sign'], mc['degree_in_sign'])),
+        ]
         
         # Interpretar aspectos principales
-        aspects = chart_data.get('aspects', [])
         if aspects:
-            interpretations['main_aspects'] = self.interpret_multiple_aspects(aspects, limit=5)
+            sections.append(('main_aspects', lambda: self.interpret_multiple_aspects(aspects, limit=5)))
         
         # Resumen general
-        interpretations['summary'] = self.generate_birth_chart_summary(
+        sections.append(('summary', lambda: self.generate_birth_chart_summary(
             chart_data,
             focus_areas=['personalidad', 'vocación', 'relaciones'] if not question else None
-        )
+        )))
         
         # Si hay una pregunta específica, generar respuesta
         if question:
-            interpretations['question_answer'] = self._answer_specific_question(
-                chart_data,
-                question
-            )
+            sections.append(('question_answer', lambda: self._answer_specific_question(chart_data, question)))
         
-        return interpretations
+        return sections
+    
+    def _generate_batched_reading(
+        self,
+        chart_data: Dict,
+        question: Optional[str],
+        keys: List[str]
+    ) -> Dict[str, str]:
+        """
+        Genera todas las secciones con un único prompt estructurado
+        
+        Returns:
+            Secciones válidas devueltas por el modelo (puede faltar alguna)
+        
+        Raises:
+            MalformedResponseError: si la respuesta está vacía o no es JSON válido
+            InterpretationError: si el servicio está saturado o la llamada falla
+        """
+        prompt = self._build_batched_prompt(chart_data, question, keys)
+        # Las secciones juntas superan el límite de salida de una llamada individual
+        text = self._generate(prompt, max_output_tokens=BATCHED_MAX_OUTPUT_TOKENS, json_keys=keys)
+        return parse_sections_json(text, keys)
+    
+    def _build_batched_prompt(self, chart_data: Dict, question: Optional[str], keys: List[str]) -> str:
+        """Construye el prompt único con los datos de la carta y las secciones pedidas"""
+        summary = chart_data.get('chart_summary', {})
+        asc = chart_data['houses']['ascendant']
+        mc = chart_data['houses']['midheaven']
+        aspects = chart_data.get('aspects', [])[:5]
+        retrograde_planets = summary.get('retrograde_planets', [])
+        
+        aspects_text = "\n".join([
+            f"- {a['planet1']['name']} {a['aspect']} {a['planet2']['name']} "
+            f"(orbe: {a['orb']:.2f}°, naturaleza: {a['nature']})"
+            for a in aspects
+        ]) or "- Sin aspectos significativos"
+        
+        instructions = {
+            'ascendant': "Cómo se presenta la persona al mundo, su energía y enfoque ante lo nuevo, "
+                         "fortalezas y áreas de desarrollo del Ascendente. Máximo 200 palabras.",
+            'midheaven': "Vocación, carrera ideal, reputación pública y consejo profesional según "
+                         "el Medio Cielo. Máximo 200 palabras.",
+            'main_aspects': "Visión conjunta de los aspectos principales, temas que emergen, balance "
+                            "entre armónicos y desafiantes, y consejo para integrarlos. Máximo 300 palabras.",
+            'summary': "Análisis completo: personalidad central (Sol, Luna, Ascendente), talentos, "
+                       "desafíos, propósito, relaciones y consejo general. Máximo 400 palabras.",
+            'question_answer': f"Respuesta directa, empática y práctica a la pregunta: {question}. "
+                               "Máximo 250 palabras.",
+        }
+        sections_text = "\n".join(f'- "{key}": {instructions[key]}' for key in keys)
+        
+        return f"""Como astrólogo experto, interpreta esta carta natal.
+
+DATOS DE LA CARTA:
+- Sol en {summary.get('sun_sign', 'Desconocido')}
+- Luna en {summary.get('moon_sign', 'Desconocido')}
+- Ascendente en {asc['sign']} a {asc['degree_in_sign']:.2f}°
+- Medio Cielo en {mc['sign']} a {mc['degree_in_sign']:.2f}°
+- Elemento dominante: {summary.get('dominant_element', 'Desconocido')}
+- Planetas retrógrados: {', '.join(retrograde_planets) if retrograde_planets else 'Ninguno'}
+
+ASPECTOS PRINCIPALES:
+{aspects_text}
+
+Responde ÚNICAMENTE con un objeto JSON válido, sin texto adicional ni bloques de código,
+con exactamente estas claves y un texto en español como valor de cada una:
+{sections_text}"""
     
     def _answer_specific_question(self, chart_data: Dict, question: str) -> str:
         """
@@ -458,15 +648,7 @@ Proporciona una respuesta:
 
 Escribe en español. Máximo 250 palabras."""
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config,
-                safety_settings=self.safety_settings
-            )
-            return response.text
-        except Exception as e:
-            return f"Error al responder pregunta: {str(e)}"
+        return self._generate(prompt)
 
 
 # Función de utilidad para uso rápido
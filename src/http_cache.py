@@ -0,0 +1,37 @@
+"""
+Validadores HTTP (ETag) para respuestas que se consultan muy a menudo
+La ETag se calcula a partir de lo que identifica la versión de los datos
+(id y updated_at de cada fila, parámetros de la consulta), no del cuerpo, así
+que la ruta puede comprobar If-None-Match y responder 304 sin leer las columnas
+pesadas ni serializar nada.
+
+Las ETags son débiles: el mismo contenido puede enviarse sin comprimir, con
+gzip o con brotli (src.compression).
+"""
+from typing import Optional
+import hashlib
+from flask import current_app, request
+
+
+def compute_etag(*parts) -> str:
+    """ETag (sin comillas) a partir de valores con repr estable: ids, fechas, cadenas"""
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _set_validators(response, etag: str):
+    response.set_etag(etag, weak=True)
+    # Datos de cada usuario: solo la caché del cliente, y siempre revalidando
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag: str) -> Optional[object]:
+    """Respuesta 304 si If-None-Match incluye `etag`; None si hay que generar el cuerpo"""
+    if request.if_none_match.contains_weak(etag):
+        return _set_validators(current_app.response_class(status=304), etag)
+    return None
+
+
+def with_etag(response, etag: str):
+    """Añade la ETag y Cache-Control a una respuesta 200"""
+    return _set_validators(response, etag)
@@ -0,0 +1,238 @@
+"""
+Backends de generación de interpretaciones
+Gemini para producción y un stub local determinista para pruebas de carga
+"""
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from config import Config
+
+# Excepciones de google.api_core que indican un fallo transitorio del servicio
+RETRYABLE_ERRORS = {
+    'ResourceExhausted',
+    'TooManyRequests',
+    'ServiceUnavailable',
+    'DeadlineExceeded',
+    'InternalServerError',
+    'GatewayTimeout',
+}
+
+
+class InterpretationBackendError(Exception):
+    """Error propio de un backend; `retryable` indica si es transitorio"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Indica si un error de cualquier backend merece reintento"""
+    retryable = getattr(error, 'retryable', None)
+    if retryable is not None:
+        return bool(retryable)
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class InterpretationBackend(ABC):
+    """Interfaz común de los proveedores de texto interpretativo"""
+
+    name = 'base'
+    # Servicio remoto con cuota: sus llamadas pasan por el limitador compartido
+    rate_limited = True
+
+    @abstractmethod
+    def generate(
+        self,
+        prompt: str,
+        max_output_tokens: Optional[int] = None,
+        json_keys: Optional[List[str]] = None
+    ) -> str:
+        """
+        Genera texto para un prompt
+
+        Args:
+            prompt: Texto del prompt
+            max_output_tokens: Límite de salida si difiere del configurado
+            json_keys: Claves esperadas cuando el prompt pide un objeto JSON
+
+        Returns:
+            Texto generado (lanza una excepción si falla, nunca texto de error)
+        """
+
+
+class GeminiBackend(InterpretationBackend):
+    """Backend sobre google.generativeai"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+        """
+        Args:
+            api_key: Clave API de Google Gemini (opcional, usa variable de entorno si no se proporciona)
+            model_name: Modelo a usar (por defecto Config.GEMINI_MODEL)
+        """
+        self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
+
+        if not self.api_key:
+            raise ValueError(
+                "GEMINI_API_KEY no configurada. "
+                "Proporciona la clave en el constructor o como variable de entorno."
+            )
+
+        # Importación diferida: la librería solo se carga si se usa este backend
+        import google.generativeai as genai
+
+        # Configurar Gemini
+        genai.configure(api_key=self.api_key)
+        self.model = genai.GenerativeModel(model_name or Config.GEMINI_MODEL)
+
+        # Configuración de generación
+        self.generation_config = {
+            'temperature': 0.7,  # Balance entre creatividad y coherencia
+            'top_p': 0.8,
+            'top_k': 40,
+            'max_output_tokens': 2048,
+        }
+
+        # Configuración de seguridad (permitir contenido astrológico)
+        self.safety_settings = [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_NONE"
+            }
+        ]
+
+    def generate(
+        self,
+        prompt: str,
+        max_output_tokens: Optional[int] = None,
+        json_keys: Optional[List[str]] = None
+    ) -> str:
+        generation_config = self.generation_config
+        if max_output_tokens:
+            generation_config = dict(generation_config, max_output_tokens=max_output_tokens)
+
+        response = self.model.generate_content(
+            prompt,
+            generation_config=generation_config,
+            safety_settings=self.safety_settings
+        )
+        # response.text lanza ValueError si la respuesta fue bloqueada
+        return response.text
+
+
+class StubBackend(InterpretationBackend):
+    """
+    Backend local basado en plantillas, sin red
+
+    El texto depende solo del prompt (mismo prompt, misma respuesta). La
+    latencia y la tasa de errores son configurables para simular el servicio
+    real en pruebas de carga.
+    """
+
+    name = 'stub'
+    # Local y sin cuota: el limitador de Gemini falsearía las pruebas de carga
+    rate_limited = False
+
+    TEMPLATES = [
+        "Esta configuración habla de {tema}. La energía se expresa con {cualidad}, "
+        "invitando a cultivar {consejo} en el día a día.",
+        "Aquí destaca {tema}. Se percibe una tendencia hacia {cualidad}; el mayor "
+        "crecimiento llega al practicar {consejo}.",
+        "El mensaje central gira en torno a {tema}. Con {cualidad} como aliada, "
+        "conviene enfocarse en {consejo}.",
+    ]
+    TEMAS = ['la identidad', 'la vocación', 'los vínculos', 'la transformación', 'la intuición']
+    CUALIDADES = ['determinación', 'sensibilidad', 'curiosidad', 'constancia', 'apertura']
+    CONSEJOS = ['la paciencia', 'la escucha interior', 'la disciplina', 'la gratitud', 'el equilibrio']
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency: Latencia artificial base en segundos
+            latency_jitter: Variación aleatoria máxima añadida a la latencia
+            error_rate: Probabilidad (0-1) de lanzar un error transitorio
+            seed: Semilla para que latencias y errores sean reproducibles
+        """
+        self.latency = max(0.0, latency)
+        self.latency_jitter = max(0.0, latency_jitter)
+        self.error_rate = min(1.0, max(0.0, error_rate))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _text_for(self, prompt: str, key: str = '') -> str:
+        digest = hashlib.sha256(f"{key}|{prompt}".encode('utf-8')).digest()
+        template = self.TEMPLATES[digest[0] % len(self.TEMPLATES)]
+        return template.format(
+            tema=self.TEMAS[digest[1] % len(self.TEMAS)],
+            cualidad=self.CUALIDADES[digest[2] % len(self.CUALIDADES)],
+            consejo=self.CONSEJOS[digest[3] % len(self.CONSEJOS)]
+        )
+
+    def generate(
+        self,
+        prompt: str,
+        max_output_tokens: Optional[int] = None,
+        json_keys: Optional[List[str]] = None
+    ) -> str:
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.latency_jitter)
+            fail = self._random.random() < self.error_rate
+
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise InterpretationBackendError("Error simulado del backend stub", retryable=True)
+
+        if json_keys:
+            return json.dumps({key: self._text_for(prompt, key) for key in json_keys}, ensure_ascii=False)
+        return self._text_for(prompt)
+
+
+def create_backend(name: Optional[str] = None, api_key: Optional[str] = None) -> InterpretationBackend:
+    """
+    Crea el backend indicado (por defecto Config.INTERPRETATION_BACKEND)
+
+    Raises:
+        ValueError: si el backend no existe o le falta configuración
+    """
+    name = (name or Config.INTERPRETATION_BACKEND).lower()
+
+    if name == 'gemini':
+        return GeminiBackend(api_key=api_key)
+
+    if name == 'stub':
+        return StubBackend(
+            latency=Config.STUB_BACKEND_LATENCY_MS / 1000.0,
+            latency_jitter=Config.STUB_BACKEND_LATENCY_JITTER_MS / 1000.0,
+            error_rate=Config.STUB_BACKEND_ERROR_RATE,
+            seed=Config.STUB_BACKEND_SEED
+        )
+
+    raise ValueError(f"Backend de interpretación desconocido: {name}")
@@ -0,0 +1,332 @@
+"""
+Corpus precalculado de interpretaciones de tarot
+Un texto por carta × orientación × posición de tirada, generado una sola vez
+con el servicio de interpretación y servido sin llamadas de red.
+
+Formato del archivo (little-endian):
+    b'TCRP' | versión u16 | longitud cabecera u32 | cabecera JSON UTF-8
+    | tabla de entradas (offset u32, longitud u32) | blob de textos UTF-8
+
+La cabecera contiene la lista de cartas y, por tirada, el primer slot y sus
+posiciones. La entrada de (carta, invertida, slot) está en el índice
+(indice_carta * 2 + invertida) * total_slots + slot, así que cada consulta es
+O(1) sobre el archivo mapeado en memoria.
+
+Uso:
+    python -m src.interpretation_corpus build [--output RUTA] [--backend stub]
+        [--rate 1.0] [--concurrency 4]
+"""
+from typing import Callable, Dict, List, Optional
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TCRP'
+VERSION = 1
+_PREFIX = struct.Struct('<4sHI')
+_ENTRY = struct.Struct('<II')
+
+DEFAULT_CORPUS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data',
+    'tarot_corpus.bin'
+)
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def write_corpus(
+    path: str,
+    cards: List[str],
+    spreads: Dict[str, List[str]],
+    generate: Callable[[str, bool, str, int], Optional[str]]
+) -> Dict:
+    """
+    Genera y escribe el corpus completo
+
+    Args:
+        path: Archivo de salida
+        cards: Nombres de las cartas (el orden define su índice)
+        spreads: Posiciones de cada tirada, por clave de tirada
+        generate: Función (carta, invertida, tirada, índice de posición) -> texto;
+            devolver None deja la entrada vacía
+
+    Returns:
+        Estadísticas de la generación
+    """
+    layout = {}
+    total_slots = 0
+    for spread_key, positions in spreads.items():
+        layout[spread_key] = {'first_slot': total_slots, 'positions': list(positions)}
+        total_slots += len(positions)
+
+    header = json.dumps(
+        {'cards': list(cards), 'spreads': layout, 'total_slots': total_slots},
+        ensure_ascii=False
+    ).encode('utf-8')
+
+    entries = []
+    blob = bytearray()
+    missing = 0
+    for card in cards:
+        for invertida in (False, True):
+            for spread_key, positions in spreads.items():
+                for index in range(len(positions)):
+                    text = generate(card, invertida, spread_key, index)
+                    if not text:
+                        missing += 1
+                        entries.append((0, 0))
+                        continue
+                    encoded = text.strip().encode('utf-8')
+                    entries.append((len(blob), len(encoded)))
+                    blob.extend(encoded)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for offset, length in entries:
+            f.write(_ENTRY.pack(offset, length))
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+    return {'entries': len(entries), 'missing': missing, 'bytes': len(blob)}
+
+
+class InterpretationCorpus:
+    """Lector perezoso del corpus: el archivo se mapea en memoria en la primera consulta"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._mmap = None
+        self._card_index: Dict[str, int] = {}
+        self._spreads: Dict[str, Dict] = {}
+        self._total_slots = 0
+        self._table_offset = 0
+        self._blob_offset = 0
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            magic, version, header_len = _PREFIX.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                data.close()
+                raise ValueError(f"Corpus de interpretaciones inválido: {self.path}")
+
+            start = _PREFIX.size
+            header = json.loads(bytes(data[start:start + header_len]).decode('utf-8'))
+            self._card_index = {name: i for i, name in enumerate(header['cards'])}
+            self._spreads = header['spreads']
+            self._total_slots = header['total_slots']
+            self._table_offset = start + header_len
+            self._blob_offset = self._table_offset + (
+                len(self._card_index) * 2 * self._total_slots * _ENTRY.size
+            )
+            self._mmap = data
+            self._loaded = True
+
+    def lookup(self, card: str, invertida: bool, spread_key: str, position_index: int) -> Optional[str]:
+        """
+        Texto para una carta en una posición de tirada
+
+        Returns:
+            El texto, o None si la combinación no existe o quedó vacía
+        """
+        if not self._loaded:
+            self._load()
+
+        card_index = self._card_index.get(card)
+        spread = self._spreads.get(spread_key)
+        if card_index is None or spread is None:
+            return None
+        if not 0 <= position_index < len(spread['positions']):
+            return None
+
+        slot = spread['first_slot'] + position_index
+        entry = (card_index * 2 + int(bool(invertida))) * self._total_slots + slot
+        offset, length = _ENTRY.unpack_from(self._mmap, self._table_offset + entry * _ENTRY.size)
+        if not length:
+            return None
+
+        start = self._blob_offset + offset
+        return self._mmap[start:start + length].decode('utf-8')
+
+
+def get_tarot_corpus() -> Optional[InterpretationCorpus]:
+    """
+    Corpus compartido del proceso, o None si no se ha generado
+
+    La ruta se toma de TAROT_CORPUS_PATH o de data/tarot_corpus.bin.
+    """
+    global _corpus
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                path = os.environ.get('TAROT_CORPUS_PATH', DEFAULT_CORPUS_PATH)
+                if not os.path.exists(path):
+                    return None
+                _corpus = InterpretationCorpus(path)
+    return _corpus
+
+
+def interpretar_posiciones(cartas: List[Dict], spread_key: str) -> Optional[List[str]]:
+    """
+    Interpretaciones precalculadas para las cartas de una lectura
+
+    Args:
+        cartas: Cartas de la lectura en orden de posición (claves 'carta' e 'invertida')
+        spread_key: Valor de TipoTirada
+
+    Returns:
+        Un texto por carta, o None si no hay corpus o falta alguna entrada
+    """
+    corpus = get_tarot_corpus()
+    if corpus is None:
+        return None
+
+    try:
+        textos = [
+            corpus.lookup(c['carta'], c['invertida'], spread_key, i)
+            for i, c in enumerate(cartas)
+        ]
+    except (OSError, ValueError) as e:
+        logger.warning("Corpus de interpretaciones no disponible: %s", e)
+        return None
+
+    if any(texto is None for texto in textos):
+        return None
+    return textos
+
+
+def build_limiter(rate: float, concurrency: int):
+    """
+    Limitador propio de la generación del corpus
+
+    Independiente del compartido por las peticiones web (GEMINI_RATE_LIMIT_*):
+    sin tiempo máximo de espera, porque en un proceso por lotes esperar turno
+    es preferible a perder la entrada.
+    """
+    from config import Config
+    from src.interpretation_backends import is_retryable_error
+    from src.rate_limiter import RateLimitedCaller
+
+    concurrency = max(1, concurrency)
+    return RateLimitedCaller(
+        rate=rate,
+        burst=concurrency,
+        initial_concurrency=concurrency,
+        max_concurrency=concurrency,
+        latency_target=Config.GEMINI_LATENCY_TARGET_SECONDS,
+        max_retries=Config.GEMINI_MAX_RETRIES,
+        acquire_timeout=None,
+        is_retryable=is_retryable_error
+    )
+
+
+def build_tarot_corpus(output: str, backend: Optional[str] = None, workers: int = 4,
+                       rate: Optional[float] = None) -> Dict:
+    """
+    Genera el corpus completo con el servicio de interpretación
+
+    Args:
+        output: Ruta del archivo a escribir
+        backend: 'gemini' o 'stub' (por defecto Config.INTERPRETATION_BACKEND)
+        workers: Llamadas simultáneas
+        rate: Llamadas por segundo a un backend con cuota (por defecto
+            GEMINI_RATE_LIMIT_PER_SECOND); el stub no se limita
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from config import Config
+    from src.gemini_service import GeminiAstrologyService, InterpretationError
+    from src.interpretation_backends import create_backend
+    from src.tarot_reader_enhanced import MazoTarot, LectorTarot
+
+    generator = create_backend(backend)
+    limiter = None
+    if generator.rate_limited:
+        limiter = build_limiter(rate or Config.GEMINI_RATE_LIMIT_PER_SECOND, workers)
+    service = GeminiAstrologyService(backend=generator, limiter=limiter)
+
+    # Las cartas se toman de la definición del mazo sin barajar
+    mazo = MazoTarot.__new__(MazoTarot)
+    mazo.cartas = []
+    mazo._crear_arcanos_mayores()
+    mazo._crear_arcanos_menores()
+    cartas = {carta.nombre: carta for carta in mazo.cartas}
+
+    lector = LectorTarot.__new__(LectorTarot)
+    tiradas = lector._definir_tiradas()
+    spreads = {tipo.value: info['posiciones'] for tipo, info in tiradas.items()}
+    spread_names = {tipo.value: info['nombre'] for tipo, info in tiradas.items()}
+
+    def generate_one(key):
+        nombre, invertida, spread_key, index = key
+        carta = cartas[nombre]
+        try:
+            return service.interpret_tarot_position(
+                nombre,
+                invertida,
+                carta.obtener_significado(invertida),
+                carta.palabras_clave,
+                spread_names[spread_key],
+                spreads[spread_key][index]
+            )
+        except InterpretationError as e:
+            logger.warning("Sin texto para %s: %s", key, e)
+            return None
+
+    keys = [
+        (nombre, invertida, spread_key, index)
+        for nombre in sorted(cartas)
+        for invertida in (False, True)
+        for spread_key, positions in spreads.items()
+        for index in range(len(positions))
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        texts = dict(zip(keys, pool.map(generate_one, keys)))
+
+    return write_corpus(
+        output,
+        sorted(cartas),
+        spreads,
+        lambda nombre, invertida, spread_key, index: texts[(nombre, invertida, spread_key, index)]
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Corpus precalculado de interpretaciones de tarot')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser(
+        'build',
+        help='Genera el corpus con el servicio de interpretación',
+        description='Genera el corpus: una llamada por carta, orientación y posición '
+                    '(unas 9.000). Con Gemini la duración la marca --rate: unas 2,5 h a '
+                    '1 llamada/s, unos 15 min a 10 llamadas/s (si la cuota lo permite). '
+                    'Con --backend stub no hay límite y tarda segundos.'
+    )
+    build.add_argument('--output', default=os.environ.get('TAROT_CORPUS_PATH', DEFAULT_CORPUS_PATH))
+    build.add_argument('--backend', choices=['gemini', 'stub'], default=None)
+    build.add_argument('--rate', type=float, default=None,
+                       help='Llamadas por segundo a Gemini (por defecto GEMINI_RATE_LIMIT_PER_SECOND)')
+    build.add_argument('--concurrency', '--workers', dest='workers', type=int, default=4, metavar='N',
+                       help='Llamadas simultáneas (por defecto 4)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = build_tarot_corpus(args.output, backend=args.backend, workers=args.workers, rate=args.rate)
+    print(f"✅ Corpus generado en {args.output}: {stats}")
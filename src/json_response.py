@@ -0,0 +1,47 @@
+"""
+Respuestas JSON con fragmentos ya serializados
+Permite enviar documentos JSON guardados en la base de datos tal cual, sin
+decodificarlos y volver a codificarlos en cada petición.
+"""
+from typing import Any
+import json
+from flask import current_app
+
+
+class RawJSON(str):
+    """Cadena que ya es JSON válido y se inserta sin escapar en la respuesta"""
+    __slots__ = ()
+
+
+def dumps(value: Any, sort_keys: bool = True, ensure_ascii: bool = True) -> str:
+    """
+    Serializa `value` insertando los RawJSON literalmente
+
+    Las opciones por defecto coinciden con las de jsonify (claves ordenadas,
+    salida compacta).
+    """
+    if isinstance(value, RawJSON):
+        return str(value)
+
+    if isinstance(value, dict):
+        items = sorted(value.items()) if sort_keys else value.items()
+        return '{' + ','.join(
+            json.dumps(str(key), ensure_ascii=ensure_ascii) + ':' + dumps(item, sort_keys, ensure_ascii)
+            for key, item in items
+        ) + '}'
+
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(dumps(item, sort_keys, ensure_ascii) for item in value) + ']'
+
+    return json.dumps(value, ensure_ascii=ensure_ascii, default=getattr(current_app.json, 'default', None))
+
+
+def json_response(payload: Any, status: int = 200):
+    """Equivalente a `jsonify(payload), status` que admite valores RawJSON"""
+    provider = current_app.json
+    body = dumps(
+        payload,
+        sort_keys=getattr(provider, 'sort_keys', True),
+        ensure_ascii=getattr(provider, 'ensure_ascii', True)
+    )
+    return current_app.response_class(body + '\n', status=status, mimetype=provider.mimetype)
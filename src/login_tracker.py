@@ -0,0 +1,102 @@
+"""
+Registro diferido de último login
+Emitir tokens no escribe en la base de datos: los instantes de login se
+acumulan en memoria y se vuelcan con un UPDATE por lotes cada pocos segundos
+y al apagar el proceso.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+import threading
+from sqlalchemy import bindparam, update
+from src.models import User, db
+from src.sqlite_writer import sqlite_writer
+from src.write_behind import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginTracker:
+    """
+    Buffer de `users.last_login` con volcado periódico
+
+    Se inicializa como las extensiones de Flask (`last_login_tracker.init_app(app)`,
+    después de `database_profile.init_app`). Sin inicializar, con intervalo 0 o
+    con el perfil de base de datos serverless, record() escribe y confirma en
+    la sesión actual como antes.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[PeriodicFlusher] = None
+
+    def init_app(self, app):
+        """Arranca el volcado periódico (LAST_LOGIN_FLUSH_INTERVAL_SECONDS)"""
+        from src.db_engine import database_profile
+
+        interval = float(app.config.get('LAST_LOGIN_FLUSH_INTERVAL_SECONDS', 5))
+        if interval <= 0:
+            return
+        if database_profile.profile == 'serverless':
+            # Las instancias serverless se congelan o terminan sin ejecutar el
+            # hilo de volcado ni atexit: el buffer se perdería
+            logger.info("Perfil serverless: users.last_login se escribe en cada login")
+            return
+        self.app = app
+        self._flusher = PeriodicFlusher(
+            'last-login-flush',
+            interval,
+            self._flush_in_context
+        )
+        self._flusher.start()
+
+    def record(self, user: User, when: Optional[datetime] = None) -> datetime:
+        """Anota un login; devuelve el instante registrado"""
+        when = when or datetime.utcnow()
+        if self.app is None:
+            user.last_login = when
+            db.session.commit()
+            return when
+
+        with self._lock:
+            previous = self._pending.get(user.id)
+            if previous is None or when > previous:
+                self._pending[user.id] = when
+        return when
+
+    def flush(self):
+        """Escribe los logins pendientes con un único UPDATE por lotes"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        table = User.__table__
+        stmt = update(table).where(table.c.id == bindparam('_user_id')).values(
+            last_login=bindparam('_last_login')
+        )
+        params = [{'_user_id': user_id, '_last_login': when} for user_id, when in pending.items()]
+
+        def write():
+            db.session.execute(stmt, params)
+
+        try:
+            sqlite_writer.run(write)
+        except Exception:
+            with self._lock:
+                for user_id, when in pending.items():
+                    current = self._pending.get(user_id)
+                    if current is None or when > current:
+                        self._pending[user_id] = when
+            raise
+
+    def _flush_in_context(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self.flush()
+
+
+last_login_tracker = LastLoginTracker()
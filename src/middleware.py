@@ -1,46 +1,146 @@
 """
 Middleware para verificar límites freemium
 """
-from flask import jsonify
+from flask import g, jsonify, make_response
+from sqlalchemy.dialects import postgresql, sqlite
 from src.models import User, UsageLimit, db
+from src.quota_service import quota_service
+from src.sqlite_writer import sqlite_writer
 from datetime import date
 from config import Config
 
 
+def reserve_usage(user_id, day, limit):
+    """
+    Incrementa el contador diario solo si está por debajo del límite
+    
+    Un único UPSERT condicional (INSERT ... ON CONFLICT ... DO UPDATE ...
+    WHERE readings_count < limit RETURNING) en SQLite y PostgreSQL, por lo que
+    dos peticiones simultáneas no pueden superar el límite. No hace commit:
+    la reserva se confirma o se deshace junto con la transacción de la lectura.
+    
+    Retorna el nuevo contador, o None si el límite ya se había alcanzado
+    """
+    if limit <= 0:
+        return None
+    
+    table = UsageLimit.__table__
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table).values(user_id=user_id, date=day, readings_count=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.date],
+            set_={'readings_count': table.c.readings_count + 1},
+            where=table.c.readings_count < limit
+        ).returning(table.c.readings_count)
+        return db.session.execute(stmt).scalar()
+    
+    # Otros motores: bloqueo de fila y actualización en la misma transacción
+    usage = UsageLimit.query.filter_by(user_id=user_id, date=day).with_for_update().first()
+    if not usage:
+        usage = UsageLimit(user_id=user_id, date=day, readings_count=1)
+        db.session.add(usage)
+        db.session.flush()
+        return usage.readings_count
+    if usage.readings_count >= limit:
+        return None
+    usage.readings_count += 1
+    db.session.flush()
+    return usage.readings_count
+
+
+def release_usage(user_id, day):
+    """Devuelve una lectura reservada y ya confirmada (sin commit)"""
+    table = UsageLimit.__table__
+    db.session.execute(
+        table.update().where(
+            table.c.user_id == user_id,
+            table.c.date == day,
+            table.c.readings_count > 0
+        ).values(readings_count=table.c.readings_count - 1)
+    )
+
+
 class FreemiumMiddleware:
     """Middleware para gestionar límites del plan freemium"""
     
+    # Los métodos aceptan un User o sus Entitlements (src.entitlements): ambos
+    # exponen id, subscription_plan e is_premium().
+    
     @staticmethod
     def check_reading_limit(user):
         """
-        Verifica si el usuario puede realizar una lectura
+        Verifica si el usuario puede realizar una lectura (solo lectura, no reserva)
         Retorna (puede_leer: bool, mensaje: str, lecturas_restantes: int)
         """
         # Usuarios premium no tienen límites
         if user.is_premium():
             return True, "Usuario premium - sin límites", -1
         
-        # Obtener o crear registro de uso para hoy
-        today = date.today()
-        usage = UsageLimit.query.filter_by(
-            user_id=user.id,
-            date=today
-        ).first()
-        
-        if not usage:
-            usage = UsageLimit(user_id=user.id, date=today, readings_count=0)
-            db.session.add(usage)
-            db.session.commit()
+        readings_today = FreemiumMiddleware.get_readings_today(user)
         
         # Verificar límite
         limit = Config.FREE_DAILY_READINGS
-        remaining = limit - usage.readings_count
+        remaining = limit - readings_today
         
-        if usage.readings_count >= limit:
+        if readings_today >= limit:
             return False, f"Has alcanzado el límite de {limit} lecturas diarias. Actualiza a Premium para lecturas ilimitadas.", 0
         
         return True, f"Lecturas restantes hoy: {remaining}", remaining
     
+    @staticmethod
+    def reserve_reading(user):
+        """
+        Reserva atómicamente una lectura del cupo diario
+        Retorna (reservada: bool, lecturas_hoy: int)
+        """
+        # Usuarios premium no tienen límites ni consumen cupo
+        if user.is_premium():
+            return True, None
+        
+        if quota_service.enabled:
+            count = quota_service.reserve(user.id, Config.FREE_DAILY_READINGS)
+        elif sqlite_writer.active:
+            # Con el escritor SQLite la reserva se confirma en su propia unidad
+            user_id, day = user.id, date.today()
+            count = sqlite_writer.run(lambda: reserve_usage(user_id, day, Config.FREE_DAILY_READINGS))
+        else:
+            count = reserve_usage(user.id, date.today(), Config.FREE_DAILY_READINGS)
+        if count is None:
+            return False, Config.FREE_DAILY_READINGS
+        return True, count
+    
+    @staticmethod
+    def release_reading(user):
+        """
+        Devuelve una reserva cuya lectura no llegó a crearse
+        
+        Solo es necesario con el nivel en memoria o con el escritor SQLite
+        (donde la reserva ya se confirmó); en otro caso se deshace con el
+        rollback de la transacción.
+        """
+        if user.is_premium():
+            return
+        if quota_service.enabled:
+            quota_service.release(user.id)
+        elif sqlite_writer.active:
+            user_id, day = user.id, date.today()
+            sqlite_writer.run(lambda: release_usage(user_id, day))
+    
+    @staticmethod
+    def get_readings_today(user):
+        """Lecturas registradas hoy para el usuario"""
+        if quota_service.enabled:
+            return quota_service.readings_today(user.id)
+        
+        count = db.session.query(UsageLimit.readings_count).filter_by(
+            user_id=user.id,
+            date=date.today()
+        ).scalar()
+        return count or 0
+    
     @staticmethod
     def check_spread_access(user, spread_type):
         """
@@ -52,7 +152,7 @@ class FreemiumMiddleware:
             return True, "Acceso completo"
         
         # Usuarios free solo pueden usar tiradas básicas
-        allowed_spreads = Config.FREE_ALLOWED_SPREADS
+        allowed_spreads = getattr(user, 'allowed_spreads', Config.FREE_ALLOWED_SPREADS)
         
         if spread_type not in allowed_spreads:
             return False, f"Esta tirada requiere suscripción Premium. Plan gratuito solo permite: {', '.join(allowed_spreads)}"
@@ -60,46 +160,27 @@ class FreemiumMiddleware:
         return True, "Acceso permitido"
     
     @staticmethod
-    def increment_reading_count(user):
-        """Incrementa el contador de lecturas del usuario"""
-        # No contar para usuarios premium
-        if user.is_premium():
-            return
-        
-        today = date.today()
-        usage = UsageLimit.query.filter_by(
-            user_id=user.id,
-            date=today
-        ).first()
-        
-        if not usage:
-            usage = UsageLimit(user_id=user.id, date=today, readings_count=1)
-            db.session.add(usage)
-        else:
-            usage.readings_count += 1
+    def get_usage_stats(user, readings_today=None):
+        """
+        Obtiene estadísticas de uso del usuario
         
-        db.session.commit()
-    
-    @staticmethod
-    def get_usage_stats(user):
-        """Obtiene estadísticas de uso del usuario"""
-        today = date.today()
-        usage = UsageLimit.query.filter_by(
-            user_id=user.id,
-            date=today
-        ).first()
+        Args:
+            user: Usuario
+            readings_today: Contador ya conocido (p. ej. tras reservar), evita la consulta
+        """
+        if readings_today is None:
+            readings_today = FreemiumMiddleware.get_readings_today(user)
         
         if user.is_premium():
             return {
                 'plan': 'premium',
-                'readings_today': usage.readings_count if usage else 0,
+                'readings_today': readings_today,
                 'readings_limit': -1,  # ilimitado
                 'readings_remaining': -1,
                 'allowed_spreads': 'all',
                 'is_premium': True
             }
         
-        readings_today = usage.readings_count if usage else 0
         limit = Config.FREE_DAILY_READINGS
         
         return {
@@ -113,27 +194,44 @@ class FreemiumMiddleware:
 
 
 def require_reading_limit(f):
-    """Decorador para verificar límite de lecturas"""
+    """
+    Decorador que reserva una lectura del cupo diario
+    
+    La reserva queda en la transacción de la petición: la vista debe hacer
+    commit junto con la lectura; si responde con error sin hacerlo, la
+    reserva se descarta (o se devuelve al nivel en memoria). El contador
+    resultante queda en g.readings_today.
+    """
     from functools import wraps
-    from auth import get_current_user
+    from src.auth import get_current_plan
     
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        user = get_current_user()
+        user = get_current_plan()
         if not user:
             return jsonify({'error': 'No autenticado'}), 401
         
-        can_read, message, remaining = FreemiumMiddleware.check_reading_limit(user)
+        reserved, readings_today = FreemiumMiddleware.reserve_reading(user)
         
-        if not can_read:
+        if not reserved:
+            limit = Config.FREE_DAILY_READINGS
             return jsonify({
-                'error': message,
+                'error': f"Has alcanzado el límite de {limit} lecturas diarias. Actualiza a Premium para lecturas ilimitadas.",
                 'upgrade_required': True,
-                'readings_remaining': remaining,
+                'readings_remaining': 0,
                 'plan': user.subscription_plan
             }), 403
         
-        return f(*args, **kwargs)
+        g.readings_today = readings_today
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            FreemiumMiddleware.release_reading(user)
+            raise
+        
+        if response.status_code >= 400:
+            FreemiumMiddleware.release_reading(user)
+        return response
     
     return decorated_function
 
@@ -141,12 +239,12 @@ def require_reading_limit(f):
 def require_spread_access(f):
     """Decorador para verificar acceso a tipo de tirada"""
     from functools import wraps
-    from auth import get_current_user
+    from src.auth import get_current_plan
     from flask import request
     
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        user = get_current_user()
+        user = get_current_plan()
         if not user:
             return jsonify({'error': 'No autenticado'}), 401
         
@@ -3,10 +3,148 @@ Modelos de base de datos para el sistema de Tarot
 """
 from datetime import datetime, date
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import deferred, load_only, validates
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import TypeDecorator
+from src.json_response import RawJSON
+from src.password_hashing import password_hasher
+from src.read_routing import RoutingSession
 import json
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+class _RawJSONB(JSONB):
+    """JSONB sin (de)serialización del driver: el valor viaja como texto"""
+
+    def bind_processor(self, dialect):
+        return None
+
+    def result_processor(self, dialect, coltype):
+        return None
+
+
+class _JSONFromText(FunctionElement):
+    """Parámetro JSON en texto → tipo nativo de la columna"""
+    type = Text()
+    inherit_cache = True
+
+
+class _JSONAsText(FunctionElement):
+    """Columna JSON nativa → texto, sin decodificar en el driver"""
+    type = Text()
+    inherit_cache = True
+
+
+@compiles(_JSONFromText)
+@compiles(_JSONAsText)
+def _compile_json_passthrough(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(_JSONFromText, 'postgresql')
+def _compile_json_from_text_pg(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS JSONB)"
+
+
+@compiles(_JSONAsText, 'postgresql')
+def _compile_json_as_text_pg(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS TEXT)"
+
+
+class JSONText(TypeDecorator):
+    """
+    Documento JSON guardado como texto serializado
+
+    En PostgreSQL la columna es JSONB nativo; en el resto (SQLite) es TEXT.
+    En ambos casos el atributo del modelo contiene la cadena JSON tal cual,
+    así que puede enviarse en una respuesta sin decodificar y volver a codificar.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(_RawJSONB())
+        return dialect.type_descriptor(Text())
+
+    def bind_expression(self, bindvalue):
+        return _JSONFromText(bindvalue)
+
+    def column_expression(self, colexpr):
+        return _JSONAsText(colexpr)
+
+
+class JSONPayloadMixin:
+    """
+    Decodificación perezosa y memoizada de columnas JSONText
+
+    Cada columna se decodifica como mucho una vez por instancia; la caché se
+    invalida sola cuando cambia la cadena guardada en la columna.
+    """
+
+    def _decode_json(self, column, default_factory):
+        raw = getattr(self, column)
+        if not raw:
+            return default_factory()
+
+        cache = self.__dict__.setdefault('_json_cache', {})
+        cached = cache.get(column)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+
+        value = json.loads(raw)
+        cache[column] = (raw, value)
+        return value
+
+    def _encode_json(self, column, value):
+        setattr(self, column, json.dumps(value, ensure_ascii=False))
+        self.__dict__.setdefault('_json_cache', {}).pop(column, None)
+
+    def _raw_json(self, column, empty):
+        """Valor de la columna sin decodificar, listo para json_response"""
+        return RawJSON(getattr(self, column) or empty)
+
+
+class SparseFieldsMixin:
+    """
+    Selección de campos de respuesta (`?fields=a,b`) y de las columnas que cargan
+
+    Cada modelo declara en FIELDS qué columnas necesita cada campo de su
+    to_dict(); así los listados pueden pedir solo esas columnas con load_only.
+    """
+    FIELDS: dict = {}
+
+    @classmethod
+    def parse_fields(cls, raw):
+        """
+        Campos pedidos en el parámetro `fields`, o None si no se indicó
+
+        Raises:
+            ValueError: Si algún campo no existe
+        """
+        if not raw:
+            return None
+        fields = [f.strip() for f in raw.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in cls.FIELDS]
+        if unknown:
+            raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+        return fields
+
+    @classmethod
+    def load_only_fields(cls, fields):
+        """Opción de consulta que carga solo las columnas de `fields`"""
+        columns = {column for field in fields for column in cls.FIELDS[field]}
+        return load_only(*[getattr(cls, column) for column in sorted(columns)])
+
+    @staticmethod
+    def _select_fields(values, fields):
+        if fields is None:
+            return {name: value() for name, value in values.items()}
+        return {name: values[name]() for name in fields}
 
 
 class User(db.Model):
@@ -16,6 +154,9 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
+    # Username normalizado para el login sin distinguir mayúsculas (ver find_by_login);
+    # único: dos usuarios que solo difieren en mayúsculas serían ambiguos
+    username_lower = db.Column(db.String(80), nullable=True, unique=True, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     
     # Suscripción
@@ -36,13 +177,46 @@ class User(db.Model):
     readings = db.relationship('Reading', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     usage_limits = db.relationship('UsageLimit', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
+    @staticmethod
+    def normalize_username(username):
+        """Forma normalizada de un username para búsquedas sin mayúsculas"""
+        return username.strip().casefold() if username else username
+    
+    @validates('username')
+    def _sync_username_lower(self, key, username):
+        self.username_lower = User.normalize_username(username)
+        return username
+    
+    @classmethod
+    def find_by_login(cls, identifier):
+        """
+        Usuario por email o username (sin distinguir mayúsculas)
+        
+        Una sola consulta puntual sobre un índice: la forma del identificador
+        decide la columna (con '@' se busca por email, si no por username_lower).
+        Solo si un identificador con '@' no corresponde a ningún email se
+        prueba como username.
+        """
+        identifier = cls.normalize_username(identifier)
+        if not identifier:
+            return None
+        if '@' in identifier:
+            user = cls.query.filter(cls.email == identifier).first()
+            if user is not None:
+                return user
+        return cls.query.filter(cls.username_lower == identifier).first()
+    
     def set_password(self, password):
-        """Establece el hash de la contraseña"""
-        self.password_hash = generate_password_hash(password)
+        """Establece el hash de la contraseña (calculado en el pool de hash)"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verifica la contraseña"""
-        return check_password_hash(self.password_hash, password)
+        """Verifica la contraseña (calculado en el pool de hash)"""
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True si el hash se generó con otro método o coste que el configurado"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def is_premium(self):
         """Verifica si el usuario tiene plan premium activo"""
@@ -76,7 +250,7 @@ class User(db.Model):
         return data
 
 
-class Reading(db.Model):
+class Reading(JSONPayloadMixin, SparseFieldsMixin, db.Model):
     """Modelo de lectura de tarot"""
     __tablename__ = 'readings'
     
@@ -86,35 +260,105 @@ class Reading(db.Model):
     # Datos de la lectura
     spread_type = db.Column(db.String(50), nullable=False)  # tipo de tirada
     question = db.Column(db.Text, nullable=True)
-    cards_data = db.Column(db.Text, nullable=False)  # JSON con las cartas
+    cards_data = db.Column(JSONText, nullable=False)  # JSON con las cartas
     interpretation = db.Column(db.Text, nullable=True)
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Cambia con cada modificación; junto con el id forma la ETag del historial
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_favorite = db.Column(db.Boolean, default=False)
     notes = db.Column(db.Text, nullable=True)
     
     def set_cards(self, cards_list):
         """Guarda las cartas como JSON"""
-        self.cards_data = json.dumps(cards_list, ensure_ascii=False)
+        self._encode_json('cards_data', cards_list)
     
     def get_cards(self):
-        """Obtiene las cartas desde JSON"""
-        return json.loads(self.cards_data) if self.cards_data else []
+        """Obtiene las cartas desde JSON (decodificadas una vez por instancia)"""
+        return self._decode_json('cards_data', list)
+    
+    FIELDS = {
+        'id': ['id'],
+        'user_id': ['user_id'],
+        'spread_type': ['spread_type'],
+        'question': ['question'],
+        'cards': ['cards_data'],
+        'interpretation': ['interpretation'],
+        'created_at': ['created_at'],
+        'updated_at': ['updated_at', 'created_at'],
+        'is_favorite': ['is_favorite'],
+        'notes': ['notes']
+    }
+    
+    def to_dict(self, raw_json=False, fields=None):
+        """
+        Convierte la lectura a diccionario
+        
+        Con raw_json=True las cartas se devuelven sin decodificar (RawJSON),
+        para responder con json_response. Con `fields` solo se incluyen (y
+        solo se leen) esos campos.
+        """
+        return self._select_fields({
+            'id': lambda: self.id,
+            'user_id': lambda: self.user_id,
+            'spread_type': lambda: self.spread_type,
+            'question': lambda: self.question,
+            'cards': lambda: self._raw_json('cards_data', '[]') if raw_json else self.get_cards(),
+            'interpretation': lambda: self.interpretation,
+            'created_at': lambda: self.created_at.isoformat(),
+            'updated_at': lambda: (self.updated_at or self.created_at).isoformat(),
+            'is_favorite': lambda: self.is_favorite,
+            'notes': lambda: self.notes
+        }, fields)
+
+
+# Paginación por cursor del historial: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+db.Index('ix_readings_user_created_id', Reading.user_id, Reading.created_at.desc(), Reading.id.desc())
+# Historial filtrado por tirada (y recuento por tirada)
+db.Index(
+    'ix_readings_user_spread_created_id',
+    Reading.user_id, Reading.spread_type, Reading.created_at.desc(), Reading.id.desc()
+)
+# Solo favoritas: índice parcial, pequeño porque pocas lecturas lo son
+db.Index(
+    'ix_readings_user_favorite_created_id',
+    Reading.user_id, Reading.created_at.desc(), Reading.id.desc(),
+    postgresql_where=Reading.is_favorite == True,  # noqa: E712
+    sqlite_where=Reading.is_favorite == True  # noqa: E712
+)
+
+
+class UserReadingStats(JSONPayloadMixin, db.Model):
+    """
+    Estadísticas de lecturas por usuario, mantenidas de forma incremental
+    
+    Se actualizan en la misma transacción que crea, borra o marca como
+    favorita una lectura (src.reading_stats) y se reconstruyen con
+    `flask --app app rebuild-reading-stats`.
+    """
+    __tablename__ = 'user_reading_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_readings = db.Column(db.Integer, default=0, nullable=False)
+    favorite_readings = db.Column(db.Integer, default=0, nullable=False)
+    spread_counts = db.Column(JSONText, nullable=False, default='{}')  # {tirada: lecturas}
+    daily_counts = db.Column(JSONText, nullable=False, default='{}')  # {fecha ISO: lecturas}, últimos días
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        """Convierte la lectura a diccionario"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'spread_type': self.spread_type,
-            'question': self.question,
-            'cards': self.get_cards(),
-            'interpretation': self.interpretation,
-            'created_at': self.created_at.isoformat(),
-            'is_favorite': self.is_favorite,
-            'notes': self.notes
-        }
+    def get_spread_counts(self):
+        """Lecturas por tipo de tirada"""
+        return self._decode_json('spread_counts', dict)
+    
+    def set_spread_counts(self, counts):
+        self._encode_json('spread_counts', counts)
+    
+    def get_daily_counts(self):
+        """Lecturas por día (solo los días recientes)"""
+        return self._decode_json('daily_counts', dict)
+    
+    def set_daily_counts(self, counts):
+        self._encode_json('daily_counts', counts)
 
 
 class UsageLimit(db.Model):
@@ -184,7 +428,28 @@ class Subscription(db.Model):
         }
 
 
-class BirthChart(db.Model):
+# Suscripción activa más reciente e historial del usuario
+db.Index(
+    'ix_subscriptions_user_status_created',
+    Subscription.user_id, Subscription.status, Subscription.created_at.desc()
+)
+db.Index('ix_subscriptions_user_created', Subscription.user_id, Subscription.created_at.desc())
+
+
+class RevokedToken(db.Model):
+    """Tokens JWT revocados (logout) hasta su expiración"""
+    __tablename__ = 'revoked_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    token_type = db.Column(db.String(10), nullable=False)  # 'access' o 'refresh'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class BirthChart(JSONPayloadMixin, SparseFieldsMixin, db.Model):
     """Modelo para cartas natales astrológicas"""
     __tablename__ = 'birth_charts'
     
@@ -198,17 +463,18 @@ class BirthChart(db.Model):
     longitude = db.Column(db.Float, nullable=False)
     location_name = db.Column(db.String(200), nullable=True)
     
-    # Datos calculados (almacenados como JSON)
-    planetary_positions = db.Column(db.Text, nullable=False)  # JSON
-    houses_data = db.Column(db.Text, nullable=False)  # JSON
-    aspects_data = db.Column(db.Text, nullable=False)  # JSON
-    chart_summary = db.Column(db.Text, nullable=True)  # JSON
+    # Datos calculados (almacenados como JSON). Se cargan diferidos, juntos,
+    # solo cuando se accede a alguno: los listados no los necesitan.
+    planetary_positions = deferred(db.Column(JSONText, nullable=False), group='payload')
+    houses_data = deferred(db.Column(JSONText, nullable=False), group='payload')
+    aspects_data = deferred(db.Column(JSONText, nullable=False), group='payload')
+    chart_summary = deferred(db.Column(JSONText, nullable=True), group='payload')
     
     # Sistema de casas utilizado
     house_system = db.Column(db.String(1), default='P')  # P=Placidus, K=Koch, E=Equal
     
     # Interpretaciones (generadas por Gemini)
-    interpretations = db.Column(db.Text, nullable=True)  # JSON
+    interpretations = deferred(db.Column(JSONText, nullable=True), group='payload')
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -222,72 +488,108 @@ class BirthChart(db.Model):
     
     def set_planetary_positions(self, positions_dict):
         """Guarda posiciones planetarias como JSON"""
-        self.planetary_positions = json.dumps(positions_dict, ensure_ascii=False)
+        self._encode_json('planetary_positions', positions_dict)
     
     def get_planetary_positions(self):
         """Obtiene posiciones planetarias desde JSON"""
-        return json.loads(self.planetary_positions) if self.planetary_positions else {}
+        return self._decode_json('planetary_positions', dict)
     
     def set_houses_data(self, houses_dict):
         """Guarda datos de casas como JSON"""
-        self.houses_data = json.dumps(houses_dict, ensure_ascii=False)
+        self._encode_json('houses_data', houses_dict)
     
     def get_houses_data(self):
         """Obtiene datos de casas desde JSON"""
-        return json.loads(self.houses_data) if self.houses_data else {}
+        return self._decode_json('houses_data', dict)
     
     def set_aspects_data(self, aspects_list):
         """Guarda aspectos como JSON"""
-        self.aspects_data = json.dumps(aspects_list, ensure_ascii=False)
+        self._encode_json('aspects_data', aspects_list)
     
     def get_aspects_data(self):
         """Obtiene aspectos desde JSON"""
-        return json.loads(self.aspects_data) if self.aspects_data else []
+        return self._decode_json('aspects_data', list)
     
     def set_chart_summary(self, summary_dict):
         """Guarda resumen de carta como JSON"""
-        self.chart_summary = json.dumps(summary_dict, ensure_ascii=False)
+        self._encode_json('chart_summary', summary_dict)
     
     def get_chart_summary(self):
         """Obtiene resumen de carta desde JSON"""
-        return json.loads(self.chart_summary) if self.chart_summary else {}
+        return self._decode_json('chart_summary', dict)
     
     def set_interpretations(self, interpretations_dict):
         """Guarda interpretaciones como JSON"""
-        self.interpretations = json.dumps(interpretations_dict, ensure_ascii=False)
+        self._encode_json('interpretations', interpretations_dict)
     
     def get_interpretations(self):
         """Obtiene interpretaciones desde JSON"""
-        return json.loads(self.interpretations) if self.interpretations else {}
-    
-    def to_dict(self, include_full_data=True):
-        """Convierte la carta natal a diccionario"""
-        data = {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'birth_datetime': self.birth_datetime.isoformat(),
-            'timezone': self.timezone,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'location_name': self.location_name,
-            'house_system': self.house_system,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'is_favorite': self.is_favorite,
-            'notes': self.notes
-        }
+        return self._decode_json('interpretations', dict)
+    
+    FIELDS = {
+        'id': ['id'],
+        'user_id': ['user_id'],
+        'name': ['name'],
+        'birth_datetime': ['birth_datetime'],
+        'timezone': ['timezone'],
+        'latitude': ['latitude'],
+        'longitude': ['longitude'],
+        'location_name': ['location_name'],
+        'house_system': ['house_system'],
+        'created_at': ['created_at'],
+        'updated_at': ['updated_at'],
+        'is_favorite': ['is_favorite'],
+        'notes': ['notes'],
+        'planetary_positions': ['planetary_positions'],
+        'houses': ['houses_data'],
+        'aspects': ['aspects_data'],
+        'chart_summary': ['chart_summary'],
+        'interpretations': ['interpretations']
+    }
+    
+    # Campos de to_dict(include_full_data=False)
+    SUMMARY_FIELDS = [
+        'id', 'user_id', 'name', 'birth_datetime', 'timezone', 'latitude', 'longitude',
+        'location_name', 'house_system', 'created_at', 'updated_at', 'is_favorite', 'notes'
+    ]
+    
+    def to_dict(self, include_full_data=True, raw_json=False, fields=None):
+        """
+        Convierte la carta natal a diccionario
         
-        if include_full_data:
-            data.update({
-                'planetary_positions': self.get_planetary_positions(),
-                'houses': self.get_houses_data(),
-                'aspects': self.get_aspects_data(),
-                'chart_summary': self.get_chart_summary(),
-                'interpretations': self.get_interpretations()
-            })
+        Con raw_json=True los datos JSON se devuelven sin decodificar (RawJSON),
+        para responder con json_response. `fields` sustituye a include_full_data
+        y limita los campos incluidos (y leídos).
+        """
+        if fields is None:
+            fields = list(self.FIELDS) if include_full_data else self.SUMMARY_FIELDS
         
-        return data
+        def payload(column, empty, getter):
+            return lambda: self._raw_json(column, empty) if raw_json else getter()
+        
+        return self._select_fields({
+            'id': lambda: self.id,
+            'user_id': lambda: self.user_id,
+            'name': lambda: self.name,
+            'birth_datetime': lambda: self.birth_datetime.isoformat(),
+            'timezone': lambda: self.timezone,
+            'latitude': lambda: self.latitude,
+            'longitude': lambda: self.longitude,
+            'location_name': lambda: self.location_name,
+            'house_system': lambda: self.house_system,
+            'created_at': lambda: self.created_at.isoformat(),
+            'updated_at': lambda: self.updated_at.isoformat(),
+            'is_favorite': lambda: self.is_favorite,
+            'notes': lambda: self.notes,
+            'planetary_positions': payload('planetary_positions', '{}', self.get_planetary_positions),
+            'houses': payload('houses_data', '{}', self.get_houses_data),
+            'aspects': payload('aspects_data', '[]', self.get_aspects_data),
+            'chart_summary': payload('chart_summary', '{}', self.get_chart_summary),
+            'interpretations': payload('interpretations', '{}', self.get_interpretations)
+        }, fields)
+
+
+db.Index('ix_birth_charts_user_created_id', BirthChart.user_id, BirthChart.created_at.desc(), BirthChart.id.desc())
 
 
 class AspectRecord(db.Model):
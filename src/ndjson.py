@@ -0,0 +1,58 @@
+"""
+Utilidades NDJSON (un documento JSON por línea) para exportar e importar en
+streaming: ni la respuesta ni el cuerpo de la petición se cargan enteros en memoria.
+"""
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+import json
+from flask import Response, stream_with_context
+from src.json_response import dumps
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def ndjson_response(rows: Iterable[Any], serialize: Callable[[Any], Any], filename: Optional[str] = None) -> Response:
+    """
+    Respuesta en streaming con una línea JSON por fila
+
+    Args:
+        rows: Iterable perezoso (p. ej. un resultado con yield_per)
+        serialize: Fila -> valor serializable (admite RawJSON)
+        filename: Si se indica, se sirve como descarga
+    """
+    def generate():
+        for row in rows:
+            yield dumps(serialize(row)) + '\n'
+
+    headers = {}
+    if filename:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+
+def read_ndjson(stream) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """
+    Documentos de un flujo NDJSON, línea a línea
+
+    Yields:
+        (número de línea, documento o None, error o None); las líneas vacías se omiten
+    """
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line), None
+        except ValueError as e:
+            yield line_no, None, f"JSON no válido: {e}"
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Agrupa un iterable en listas de como mucho `size` elementos"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
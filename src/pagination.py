@@ -0,0 +1,72 @@
+"""
+Paginación por cursor (keyset) sobre (created_at, id)
+Cada página continúa desde la última fila de la anterior con un WHERE sobre el
+índice (user_id, created_at DESC, id), sin OFFSET ni COUNT(*) por página.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import json
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Cursor opaco que apunta justo después de la fila (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Posición codificada en un cursor
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Cursor de paginación no válido')
+
+
+def keyset_paginate(query, model, per_page: int, cursor: Optional[str] = None,
+                    include_total: bool = False) -> Tuple[List[Any], Dict]:
+    """
+    Página de `query` en orden (created_at DESC, id DESC)
+
+    Args:
+        query: Query ya filtrada (sin ORDER BY)
+        model: Modelo con columnas created_at e id
+        per_page: Tamaño de página
+        cursor: `next_cursor` de la página anterior, o None para la primera
+        include_total: Si True, añade el total de filas (una consulta COUNT extra)
+
+    Returns:
+        (filas, metadatos de paginación con next_cursor y has_next)
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    total = query.order_by(None).count() if include_total else None
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id)
+        ))
+
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    pagination = {
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_next else None
+    }
+    if include_total:
+        pagination['total'] = total
+    return rows, pagination
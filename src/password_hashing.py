@@ -0,0 +1,197 @@
+"""
+Servicio de hash de contraseñas fuera de los hilos de petición
+Los hashes (scrypt/PBKDF2, deliberadamente costosos) se calculan en un pool de
+procesos dedicado y acotado: una ráfaga de logins espera en su propia cola en
+lugar de ocupar los hilos WSGI que sirven el resto de peticiones.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+import logging
+import multiprocessing
+import threading
+import time
+from werkzeug.security import check_password_hash, generate_password_hash
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class HashingOverloadedError(Exception):
+    """Demasiados hashes pendientes: la petición debe reintentarse más tarde"""
+
+
+def _timed(fn, *args) -> Tuple[object, float]:
+    # Se ejecuta en el proceso hijo: devuelve el resultado y cuándo empezó
+    started = time.time()
+    return fn(*args), started
+
+
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash: str, password: str) -> bool:
+    return check_password_hash(pwhash, password)
+
+
+def hash_method(pwhash: str) -> str:
+    """Método y parámetros con los que se generó un hash ('scrypt:32768:8:1', ...)"""
+    return pwhash.split('$', 1)[0] if pwhash else ''
+
+
+class PasswordHasher:
+    """
+    Pool acotado de procesos para generar y verificar hashes
+
+    Con workers=0 (o si la plataforma no permite crear procesos, como algunos
+    entornos serverless) los hashes se calculan en el hilo que llama, con el
+    mismo límite de trabajos simultáneos.
+    """
+
+    def __init__(self, method: str, workers: int = 2, max_pending: int = 32, acquire_timeout: float = 5.0):
+        self.method = method
+        self._canonical_method: Optional[str] = None
+        self.workers = max(0, int(workers))
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max(1, int(max_pending)))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_failed = False
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'hashes': 0,
+            'verifications': 0,
+            'rehashes': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0,
+            'run_time_total': 0.0
+        }
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 0 or self._pool_failed:
+            return None
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None and not self._pool_failed:
+                    try:
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context('spawn')
+                        )
+                    except (OSError, NotImplementedError) as e:
+                        logger.warning("Pool de hash no disponible, se calcula en el hilo: %s", e)
+                        self._pool_failed = True
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._record(rejected=1)
+            raise HashingOverloadedError('Demasiadas operaciones de autenticación en curso')
+
+        self._record(in_flight=1)
+        submitted = time.time()
+        try:
+            pool = self._get_pool()
+            result = None
+            if pool is not None:
+                try:
+                    result, started = pool.submit(_timed, fn, *args).result()
+                except BrokenProcessPool as e:
+                    # Los procesos hijos no arrancan (p. ej. el módulo principal
+                    # no está protegido con `if __name__ == '__main__'`)
+                    logger.warning("Pool de hash roto, se calcula en el hilo: %s", e)
+                    self._pool_failed = True
+                    self.shutdown()
+                    pool = None
+            if pool is None:
+                result, started = _timed(fn, *args)
+            finished = time.time()
+            self._record(
+                queue_wait=max(0.0, started - submitted),
+                run_time=max(0.0, finished - started)
+            )
+            return result
+        finally:
+            self._record(in_flight=-1)
+            self._slots.release()
+
+    def _record(self, rejected=0, in_flight=0, queue_wait=None, run_time=None):
+        with self._metrics_lock:
+            m = self._metrics
+            m['rejected'] += rejected
+            m['in_flight'] += in_flight
+            if queue_wait is not None:
+                m['queue_wait_total'] += queue_wait
+                m['queue_wait_max'] = max(m['queue_wait_max'], queue_wait)
+            if run_time is not None:
+                m['run_time_total'] += run_time
+
+    def hash(self, password: str) -> str:
+        """Hash con el método configurado"""
+        result = self._run(_hash, password, self.method)
+        with self._metrics_lock:
+            self._metrics['hashes'] += 1
+        return result
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Comprueba una contraseña contra su hash (cualquier método soportado)"""
+        result = self._run(_verify, pwhash, password)
+        with self._metrics_lock:
+            self._metrics['verifications'] += 1
+        return result
+
+    def canonical_method(self) -> str:
+        """
+        Método configurado con los parámetros que aplica werkzeug
+
+        Los valores abreviados se expanden al generar el hash ('scrypt' ->
+        'scrypt:32768:8:1', 'pbkdf2' -> 'pbkdf2:sha256:<iteraciones>'). Se
+        obtiene de un hash desechable, calculado la primera vez que se necesita
+        (no al importar, para no alargar el arranque).
+        """
+        if self._canonical_method is None:
+            self._canonical_method = hash_method(self._run(_hash, '', self.method))
+        return self._canonical_method
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """True si el hash se generó con otro método o coste que el configurado"""
+        return hash_method(pwhash) != self.canonical_method()
+
+    def record_rehash(self):
+        with self._metrics_lock:
+            self._metrics['rehashes'] += 1
+
+    def metrics(self) -> Dict:
+        """Contadores y tiempos medios de cola y de cálculo (segundos)"""
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        completed = m['hashes'] + m['verifications']
+        return {
+            'method': self._canonical_method or self.method,
+            'workers': 0 if self._pool_failed else self.workers,
+            'hashes': m['hashes'],
+            'verifications': m['verifications'],
+            'rehashes': m['rehashes'],
+            'rejected': m['rejected'],
+            'in_flight': m['in_flight'],
+            'queue_wait_avg': m['queue_wait_total'] / completed if completed else 0.0,
+            'queue_wait_max': m['queue_wait_max'],
+            'run_time_avg': m['run_time_total'] / completed if completed else 0.0
+        }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+password_hasher = PasswordHasher(
+    method=Config.PASSWORD_HASH_METHOD,
+    workers=Config.PASSWORD_HASH_WORKERS,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING,
+    acquire_timeout=Config.PASSWORD_HASH_ACQUIRE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,129 @@
+"""
+Auditoría de planes de consulta de las rutas más usadas
+Ejecuta EXPLAIN sobre la misma forma de consulta que usa cada ruta y falla si
+alguna recorre una tabla completa en lugar de usar un índice.
+
+- SQLite: EXPLAIN QUERY PLAN; un paso "SCAN <tabla>" es un recorrido completo.
+- PostgreSQL: EXPLAIN (FORMAT JSON) con enable_seqscan desactivado, para que
+  las tablas pequeñas de desarrollo no oculten la falta de índice; un nodo
+  "Seq Scan" es un recorrido completo.
+
+Uso:
+    flask --app app check-query-plans
+"""
+from datetime import date, datetime
+from typing import Callable, Dict, List, Tuple
+import json
+from sqlalchemy import and_, func, or_, select
+from src.models import (
+    BirthChart,
+    Reading,
+    Subscription,
+    UsageLimit,
+    User,
+    UserReadingStats,
+    db
+)
+
+_USER_ID = 1
+_CURSOR = (datetime(2024, 1, 1), 1000)
+
+
+def _readings_page(*criteria):
+    created_at, row_id = _CURSOR
+    return select(Reading.id, Reading.created_at).where(
+        Reading.user_id == _USER_ID,
+        or_(Reading.created_at < created_at, and_(Reading.created_at == created_at, Reading.id < row_id)),
+        *criteria
+    ).order_by(Reading.created_at.desc(), Reading.id.desc()).limit(21)
+
+
+# (nombre, ruta que la usa, constructor de la consulta)
+HOT_QUERIES: List[Tuple[str, str, Callable]] = [
+    ('readings_page', 'GET /api/readings/', lambda: _readings_page()),
+    ('readings_page_by_spread', 'GET /api/readings/?spread_type=', lambda: _readings_page(
+        Reading.spread_type == 'tres_cartas'
+    )),
+    ('readings_page_favorites', 'GET /api/readings/?is_favorite=', lambda: _readings_page(
+        Reading.is_favorite == True  # noqa: E712
+    )),
+    ('reading_by_id', 'GET/PUT/DELETE /api/readings/<id>', lambda: select(Reading).where(
+        Reading.id == 1, Reading.user_id == _USER_ID
+    )),
+    ('reading_favorites_count', 'rebuild-reading-stats', lambda: select(func.count(Reading.id)).where(
+        Reading.user_id == _USER_ID, Reading.is_favorite == True  # noqa: E712
+    )),
+    ('reading_spread_distribution', 'rebuild-reading-stats', lambda: select(
+        Reading.spread_type, func.count(Reading.id)
+    ).where(Reading.user_id == _USER_ID).group_by(Reading.spread_type)),
+    ('reading_stats', 'GET /api/user/stats', lambda: select(UserReadingStats).where(
+        UserReadingStats.user_id == _USER_ID
+    )),
+    ('usage_today', 'POST /api/readings/', lambda: select(UsageLimit.readings_count).where(
+        UsageLimit.user_id == _USER_ID, UsageLimit.date == date(2024, 1, 1)
+    )),
+    ('active_subscription', 'GET /api/subscription/current', lambda: select(Subscription).where(
+        Subscription.user_id == _USER_ID, Subscription.status == 'active'
+    ).order_by(Subscription.created_at.desc()).limit(1)),
+    ('subscription_history', 'GET /api/subscription/history', lambda: select(Subscription).where(
+        Subscription.user_id == _USER_ID
+    ).order_by(Subscription.created_at.desc())),
+    ('birth_charts_page', 'GET /api/astrology/birth-charts', lambda: select(
+        BirthChart.id, BirthChart.created_at
+    ).where(
+        BirthChart.user_id == _USER_ID,
+        or_(BirthChart.created_at < _CURSOR[0], and_(BirthChart.created_at == _CURSOR[0], BirthChart.id < _CURSOR[1]))
+    ).order_by(BirthChart.created_at.desc(), BirthChart.id.desc()).limit(21)),
+    ('user_by_email', 'POST /api/auth/login', lambda: select(User).where(User.email == 'a@b.c')),
+    ('user_by_username_lower', 'POST /api/auth/login', lambda: select(User).where(User.username_lower == 'abc')),
+    ('user_by_username', 'POST /api/auth/register', lambda: select(User).where(User.username == 'abc')),
+]
+
+
+def _sqlite_plan(conn, sql: str) -> Tuple[List[str], List[str]]:
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    steps = [row[-1] for row in rows]
+    full_scans = [step for step in steps if step.startswith('SCAN ') and 'CONSTANT ROW' not in step]
+    return steps, full_scans
+
+
+def _postgresql_plan(conn, sql: str) -> Tuple[List[str], List[str]]:
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    raw = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+
+    steps, full_scans = [], []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        label = node['Node Type']
+        if node.get('Index Name'):
+            label += f" using {node['Index Name']}"
+        if node.get('Relation Name'):
+            label += f" on {node['Relation Name']}"
+        steps.append(label)
+        if node['Node Type'] == 'Seq Scan':
+            full_scans.append(label)
+        pending.extend(node.get('Plans', []))
+    return steps, full_scans
+
+
+def check_query_plans() -> List[Dict]:
+    """
+    Plan de cada consulta de HOT_QUERIES en la base de datos configurada
+
+    Returns:
+        Un resultado por consulta: name, route, plan (pasos) y full_scans
+    """
+    engine = db.engine
+    dialect = engine.dialect
+    explain = _postgresql_plan if dialect.name == 'postgresql' else _sqlite_plan
+
+    results = []
+    with engine.connect() as conn:
+        for name, route, build in HOT_QUERIES:
+            sql = str(build().compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+            with conn.begin():
+                steps, full_scans = explain(conn, sql)
+            results.append({'name': name, 'route': route, 'plan': steps, 'full_scans': full_scans})
+    return results
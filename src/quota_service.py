@@ -0,0 +1,275 @@
+"""
+Contadores de cupo diario en memoria con escritura diferida a UsageLimit
+La base de datos queda solo para durabilidad: las comprobaciones y reservas
+se resuelven en memoria y los incrementos se vuelcan por lotes.
+"""
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+import threading
+import zlib
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models import UsageLimit, db
+from src.sqlite_writer import sqlite_writer
+from src.write_behind import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+QuotaKey = Tuple[int, date]
+
+
+class QuotaStore(ABC):
+    """
+    Almacén de contadores por (user_id, fecha)
+
+    La implementación en memoria es local al proceso; un almacén compartido
+    (p. ej. Redis) puede implementar la misma interfaz.
+    """
+
+    @abstractmethod
+    def get(self, key: QuotaKey) -> Optional[int]:
+        """Contador actual, o None si la clave no está cargada"""
+
+    @abstractmethod
+    def load(self, key: QuotaKey, persisted: int):
+        """Fija el valor persistido de la clave conservando los incrementos pendientes"""
+
+    @abstractmethod
+    def reserve(self, key: QuotaKey, limit: int) -> Optional[int]:
+        """Incrementa si está por debajo de `limit`; nuevo valor o None"""
+
+    @abstractmethod
+    def release(self, key: QuotaKey):
+        """Devuelve una reserva que no llegó a usarse"""
+
+    @abstractmethod
+    def drain_pending(self) -> Dict[QuotaKey, int]:
+        """Extrae los incrementos pendientes de volcar"""
+
+    @abstractmethod
+    def restore_pending(self, pending: Dict[QuotaKey, int]):
+        """Reincorpora incrementos cuyo volcado falló"""
+
+    @abstractmethod
+    def prune(self, before: date):
+        """Olvida claves anteriores a `before` sin incrementos pendientes"""
+
+
+class _Shard:
+    __slots__ = ('lock', 'counts', 'pending')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[QuotaKey, int] = {}
+        self.pending: Dict[QuotaKey, int] = {}
+
+
+class ShardedMemoryQuotaStore(QuotaStore):
+    """Contadores en memoria repartidos en shards con su propio lock"""
+
+    def __init__(self, shards: int = 16):
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+
+    def _shard(self, key: QuotaKey) -> _Shard:
+        return self._shards[zlib.crc32(f"{key[0]}:{key[1]}".encode()) % len(self._shards)]
+
+    def get(self, key: QuotaKey) -> Optional[int]:
+        shard = self._shard(key)
+        with shard.lock:
+            return shard.counts.get(key)
+
+    def load(self, key: QuotaKey, persisted: int):
+        shard = self._shard(key)
+        with shard.lock:
+            shard.counts[key] = persisted + shard.pending.get(key, 0)
+
+    def reserve(self, key: QuotaKey, limit: int) -> Optional[int]:
+        shard = self._shard(key)
+        with shard.lock:
+            current = shard.counts.get(key, 0)
+            if current >= limit:
+                return None
+            shard.counts[key] = current + 1
+            shard.pending[key] = shard.pending.get(key, 0) + 1
+            return current + 1
+
+    def release(self, key: QuotaKey):
+        shard = self._shard(key)
+        with shard.lock:
+            if shard.counts.get(key, 0) > 0:
+                shard.counts[key] -= 1
+            shard.pending[key] = shard.pending.get(key, 0) - 1
+            if shard.pending[key] == 0:
+                del shard.pending[key]
+
+    def drain_pending(self) -> Dict[QuotaKey, int]:
+        drained = {}
+        for shard in self._shards:
+            with shard.lock:
+                drained.update(shard.pending)
+                shard.pending = {}
+        return drained
+
+    def restore_pending(self, pending: Dict[QuotaKey, int]):
+        for key, delta in pending.items():
+            shard = self._shard(key)
+            with shard.lock:
+                shard.pending[key] = shard.pending.get(key, 0) + delta
+
+    def prune(self, before: date):
+        for shard in self._shards:
+            with shard.lock:
+                for key in [k for k in shard.counts if k[1] < before and k not in shard.pending]:
+                    del shard.counts[key]
+
+
+class QuotaService:
+    """
+    Servicio de cupos diarios con nivel en memoria
+
+    Se inicializa como las extensiones de Flask (`quota_service.init_app(app)`,
+    después de `database_profile.init_app`) y solo actúa cuando QUOTA_BACKEND
+    == 'memory' y el perfil de base de datos no es serverless. Con el backend
+    'database' las reservas usan el UPSERT atómico de src.middleware.
+    """
+
+    def __init__(self, store: Optional[QuotaStore] = None):
+        self.store = store or ShardedMemoryQuotaStore()
+        self.enabled = False
+        self.app = None
+        self._flusher = None
+
+    def init_app(self, app):
+        """Activa el servicio según la configuración, reconcilia y arranca el volcado"""
+        from src.db_engine import database_profile
+
+        if app.config.get('QUOTA_BACKEND', 'database') != 'memory':
+            return
+        if database_profile.profile == 'serverless':
+            # Las instancias serverless se congelan o terminan sin ejecutar el
+            # volcado ni atexit: los incrementos pendientes se perderían y el
+            # límite diario podría saltarse entre arranques en frío
+            logger.warning("QUOTA_BACKEND=memory ignorado con el perfil serverless: se usa 'database'")
+            return
+
+        self.app = app
+        self.enabled = True
+        self._flusher = PeriodicFlusher(
+            'quota-flush',
+            app.config.get('QUOTA_FLUSH_INTERVAL_SECONDS', 5),
+            self._flush_in_context
+        )
+
+        try:
+            with app.app_context():
+                self.reconcile()
+        except Exception as e:
+            # Las claves se cargan bajo demanda si la tabla aún no existe
+            logger.warning("Reconciliación inicial de cupos omitida: %s", e)
+
+        self._flusher.start()
+
+    def reconcile(self, day: Optional[date] = None):
+        """Carga en memoria los contadores persistidos del día"""
+        day = day or date.today()
+        rows = db.session.query(UsageLimit.user_id, UsageLimit.readings_count).filter_by(date=day).all()
+        for user_id, count in rows:
+            self.store.load((user_id, day), count or 0)
+        self.store.prune(day)
+
+    def _ensure_loaded(self, key: QuotaKey):
+        if self.store.get(key) is None:
+            count = db.session.query(UsageLimit.readings_count).filter_by(
+                user_id=key[0],
+                date=key[1]
+            ).scalar()
+            self.store.load(key, count or 0)
+
+    def readings_today(self, user_id: int) -> int:
+        """Lecturas de hoy según el nivel en memoria"""
+        key = (user_id, date.today())
+        self._ensure_loaded(key)
+        return self.store.get(key) or 0
+
+    def reserve(self, user_id: int, limit: int) -> Optional[int]:
+        """Reserva una lectura; nuevo contador o None si se alcanzó el límite"""
+        key = (user_id, date.today())
+        self._ensure_loaded(key)
+        return self.store.reserve(key, limit)
+
+    def release(self, user_id: int):
+        """Devuelve la reserva de hoy de una lectura que no se completó"""
+        self.store.release((user_id, date.today()))
+
+    def flush(self):
+        """
+        Vuelca los incrementos pendientes a UsageLimit en un solo lote
+
+        Cada clave se suma con un UPSERT (readings_count + delta), así que los
+        volcados de varios procesos se acumulan correctamente. Tras confirmar,
+        se recargan los totales para ver los incrementos de otros procesos.
+        """
+        pending = {key: delta for key, delta in self.store.drain_pending().items() if delta}
+        if not pending:
+            return
+
+        try:
+            sqlite_writer.run(lambda: add_usage(pending.items()))
+        except Exception:
+            self.store.restore_pending(pending)
+            raise
+
+        for (user_id, day), count in _load_counts(pending.keys()):
+            self.store.load((user_id, day), count)
+        self.store.prune(date.today())
+
+    def _flush_in_context(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self.flush()
+
+
+def add_usage(deltas: Iterable[Tuple[QuotaKey, int]]):
+    """Suma incrementos a UsageLimit con un UPSERT por lotes (sin commit)"""
+    table = UsageLimit.__table__
+    rows = [
+        {'user_id': user_id, 'date': day, 'readings_count': delta}
+        for (user_id, day), delta in deltas
+    ]
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.date],
+            set_={'readings_count': table.c.readings_count + stmt.excluded.readings_count}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    for row in rows:
+        usage = UsageLimit.query.filter_by(user_id=row['user_id'], date=row['date']).with_for_update().first()
+        if usage:
+            usage.readings_count = (usage.readings_count or 0) + row['readings_count']
+        else:
+            db.session.add(UsageLimit(**row))
+
+
+def _load_counts(keys: Iterable[QuotaKey]):
+    keys = list(keys)
+    user_ids = {user_id for user_id, _ in keys}
+    days = {day for _, day in keys}
+    rows = db.session.query(UsageLimit.user_id, UsageLimit.date, UsageLimit.readings_count).filter(
+        UsageLimit.user_id.in_(user_ids),
+        UsageLimit.date.in_(days)
+    ).all()
+    wanted = set(keys)
+    return [((user_id, day), count or 0) for user_id, day, count in rows if (user_id, day) in wanted]
+
+
+quota_service = QuotaService()
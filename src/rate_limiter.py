@@ -0,0 +1,237 @@
+"""
+Control de tráfico hacia servicios externos (Gemini)
+Token bucket compartido, concurrencia adaptativa (AIMD) y reintentos con jitter
+"""
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class LimiterTimeout(Exception):
+    """Se agotó el tiempo de espera para obtener permiso de llamada"""
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` tokens por segundo, ráfagas de hasta `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Consume un token, esperando si es necesario
+
+        Returns:
+            True si se obtuvo el token, False si se agotó `timeout`
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def available(self) -> float:
+        """Tokens disponibles en este momento"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Límite de llamadas simultáneas ajustado con AIMD
+
+    Incremento aditivo (+1 por ventana completa de éxitos) mientras la latencia
+    esté por debajo del objetivo; reducción multiplicativa ante errores o
+    latencias excesivas.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_target: float = 10.0,
+        backoff_ratio: float = 0.5
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.latency_target = float(latency_target)
+        self.backoff_ratio = float(backoff_ratio)
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Reserva un hueco de concurrencia; False si se agota `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._in_flight >= int(self._limit):
+                    if deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self, latency: float, success: bool):
+        """Libera el hueco y ajusta el límite según el resultado observado"""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+            if not success or latency > self.latency_target:
+                # Una sola reducción por intervalo de latencia objetivo para no
+                # colapsar el límite con fallos de llamadas ya en curso
+                if now - self._last_decrease >= self.latency_target:
+                    self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                    self._last_decrease = now
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / max(self._limit, 1.0))
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {
+                'concurrency_limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting
+            }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Retardo exponencial con full jitter para el intento `attempt` (desde 0)"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class RateLimitedCaller:
+    """
+    Punto único de salida hacia un servicio externo
+
+    Combina token bucket, concurrencia adaptativa y reintentos con jitter para
+    los errores que `is_retryable` considere transitorios. Una instancia se
+    comparte entre todos los hilos del proceso.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        initial_concurrency: int,
+        max_concurrency: int,
+        latency_target: float,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        acquire_timeout: Optional[float] = 30.0,
+        is_retryable: Optional[Callable[[Exception], bool]] = None
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial_concurrency,
+            max_limit=max_concurrency,
+            latency_target=latency_target
+        )
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.is_retryable = is_retryable or (lambda exc: False)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'rejected': 0
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _call_once(self, fn: Callable):
+        deadline = None if self.acquire_timeout is None else time.monotonic() + self.acquire_timeout
+
+        if not self.concurrency.acquire(self.acquire_timeout):
+            self._count('rejected')
+            raise LimiterTimeout('Demasiadas llamadas en curso al servicio externo')
+
+        started = None
+        success = False
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self.bucket.acquire(remaining):
+                self._count('rejected')
+                raise LimiterTimeout('Límite de peticiones por segundo alcanzado')
+
+            started = time.monotonic()
+            result = fn()
+            success = True
+            return result
+        finally:
+            latency = time.monotonic() - started if started is not None else 0.0
+            # Los rechazos locales no dicen nada del servicio remoto
+            self.concurrency.release(latency, success or started is None)
+
+    def call(self, fn: Callable):
+        """Ejecuta `fn` respetando los límites y reintentando fallos transitorios"""
+        self._count('calls')
+        attempt = 0
+        while True:
+            try:
+                result = self._call_once(fn)
+                self._count('successes')
+                return result
+            except LimiterTimeout:
+                self._count('failures')
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                attempt += 1
+
+    def metrics(self) -> Dict:
+        """Métricas actuales: profundidad de cola, llamadas en curso y contadores"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(self.concurrency.snapshot())
+        stats['tokens_available'] = round(self.bucket.available(), 2)
+        return stats
@@ -0,0 +1,149 @@
+"""
+Enrutado de lecturas a una réplica
+Las consultas de las rutas GET de lecturas, usuario y astrología van a la
+réplica (DATABASE_REPLICA_URL). Todo lo demás va a la base principal:
+
+- escrituras (flush, INSERT/UPDATE/DELETE) y cualquier consulta posterior a una
+  escritura en la misma petición;
+- código que lee para luego escribir (`use_primary()`);
+- las peticiones de un usuario durante READ_YOUR_WRITES_SECONDS tras una
+  mutación suya (POST/PUT/PATCH/DELETE con éxito). La ventana se recuerda en
+  el proceso y en una cookie, para que valga aunque la siguiente petición la
+  atienda otro proceso.
+
+Sin réplica configurada, con el escritor único de SQLite (src.sqlite_writer)
+las lecturas GET usan un pool de conexiones de solo lectura al mismo archivo.
+"""
+from typing import Dict, Optional
+import math
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql import Select
+from src.cache import TTLCache
+
+COOKIE_NAME = 'rw_until'
+
+_MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class ReadRouter:
+    """
+    Motor de réplica y reglas para usarlo
+
+    Se inicializa como las extensiones de Flask (`read_router.init_app(app)`,
+    después de `db.init_app` y de `sqlite_writer.init_app`).
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.window = 5.0
+        self._recent_writes: Optional[TTLCache] = None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'replica': 0, 'primary_fallback': 0}
+
+    def init_app(self, app):
+        from src.db_engine import database_profile, engine_options
+        from src.models import db
+        from src.sqlite_writer import sqlite_writer
+
+        uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+        if not uri and sqlite_writer.active:
+            with app.app_context():
+                uri = db.engine.url
+        if not uri:
+            return
+
+        self.window = float(app.config.get('READ_YOUR_WRITES_SECONDS', self.window))
+        self._recent_writes = TTLCache(maxsize=100000, ttl=max(self.window, 0.001))
+
+        self.engine = create_engine(uri, **engine_options(uri, database_profile.profile or 'single'))
+
+        if self.engine.dialect.name == 'sqlite':
+            @event.listens_for(self.engine, 'connect')
+            def read_only(dbapi_connection, connection_record):
+                dbapi_connection.execute('PRAGMA query_only=ON')
+
+        @app.after_request
+        def remember_writes(response):
+            if request.method in _MUTATING_METHODS and response.status_code < 400:
+                user_id = g.get('current_user_id')
+                if user_id is not None:
+                    self._recent_writes.set(user_id, True)
+                response.set_cookie(
+                    COOKIE_NAME,
+                    f'{time.time() + self.window:.3f}',
+                    max_age=math.ceil(self.window),
+                    httponly=True,
+                    samesite='Lax',
+                    secure=request.is_secure
+                )
+            return response
+
+    def use_replica(self, session, clause) -> bool:
+        """True si esta consulta de la sesión puede ir a la réplica"""
+        if self.engine is None or not has_request_context() or not g.get('db_read_replica'):
+            return False
+
+        if session._flushing or (clause is not None and not isinstance(clause, Select)):
+            # Escritura: las consultas siguientes de la petición verán sus cambios
+            g.db_read_replica = False
+            return False
+
+        user_id = g.get('current_user_id')
+        if user_id is not None and self._recent_writes.get(user_id):
+            g.db_read_replica = False
+            return False
+
+        try:
+            if float(request.cookies.get(COOKIE_NAME, 0)) > time.time():
+                g.db_read_replica = False
+                return False
+        except ValueError:
+            pass
+
+        return True
+
+    def record(self, target: str):
+        with self._metrics_lock:
+            self._metrics[target] += 1
+
+    def metrics(self) -> Dict:
+        """Consultas servidas por la réplica y peticiones GET desviadas a la principal"""
+        with self._metrics_lock:
+            counts = dict(self._metrics)
+        return {
+            'configured': self.engine is not None,
+            'dialect': self.engine.dialect.name if self.engine is not None else None,
+            'read_your_writes_seconds': self.window,
+            'replica_queries': counts['replica'],
+            'primary_fallbacks': counts['primary_fallback']
+        }
+
+
+read_router = ReadRouter()
+
+
+def route_reads_to_replica():
+    """before_request de los blueprints cuyas rutas GET leen de la réplica"""
+    g.db_read_replica = request.method == 'GET'
+
+
+def use_primary():
+    """Las consultas restantes de esta petición van a la base principal"""
+    if has_request_context():
+        g.db_read_replica = False
+
+
+class RoutingSession(Session):
+    """Sesión de Flask-SQLAlchemy que envía a la réplica las lecturas permitidas"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and read_router.engine is not None and has_request_context() and g.get('db_read_replica'):
+            if read_router.use_replica(self, clause):
+                read_router.record('replica')
+                return read_router.engine
+            read_router.record('primary_fallback')
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,204 @@
+"""
+Estadísticas de lecturas por usuario mantenidas de forma incremental
+Cada alta, baja o cambio de favorito ajusta la fila de UserReadingStats del
+usuario dentro de la misma transacción, así que consultar las estadísticas es
+una sola lectura por clave primaria. Ninguna función hace commit.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+import logging
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from src.models import Reading, User, UserReadingStats, db
+from src.read_routing import use_primary
+
+logger = logging.getLogger(__name__)
+
+# Días de lecturas recientes que se conservan por usuario
+RECENT_DAYS = 7
+
+
+def _window_start() -> date:
+    """Primer día (UTC, como created_at) de la ventana de lecturas recientes"""
+    return datetime.utcnow().date() - timedelta(days=RECENT_DAYS - 1)
+
+
+def _prune_days(daily: Dict[str, int]) -> Dict[str, int]:
+    start = _window_start().isoformat()
+    return {day: count for day, count in daily.items() if day >= start and count > 0}
+
+
+def _locked_stats(user_id: int) -> Optional[UserReadingStats]:
+    use_primary()
+    return UserReadingStats.query.filter_by(user_id=user_id).with_for_update().first()
+
+
+def _ensure_stats_row(user_id: int):
+    """
+    Crea la fila vacía del usuario si no existe
+
+    Con dos peticiones simultáneas para un usuario sin fila, FOR UPDATE no
+    bloquea nada; INSERT ... ON CONFLICT DO NOTHING (SQLite y PostgreSQL) deja
+    que una la cree y la otra siga sin error de clave duplicada.
+    """
+    table = UserReadingStats.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(insert(table).values(user_id=user_id).on_conflict_do_nothing(
+            index_elements=[table.c.user_id]
+        ))
+        return
+
+    # Otros motores: el INSERT en un savepoint, ignorando el duplicado
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(user_id=user_id))
+    except IntegrityError:
+        pass
+
+
+def rebuild_user_stats(user_id: int) -> UserReadingStats:
+    """Recalcula las estadísticas de un usuario desde la tabla de lecturas"""
+    # Se guardan a partir de lo leído: nunca desde una réplica con retraso
+    use_primary()
+    base = db.session.query(Reading).filter(Reading.user_id == user_id)
+    total = base.count()
+    favorites = base.filter(Reading.is_favorite == True).count()  # noqa: E712 (usa el índice parcial)
+
+    spreads = db.session.query(Reading.spread_type, func.count(Reading.id)).filter(
+        Reading.user_id == user_id
+    ).group_by(Reading.spread_type).all()
+
+    day = func.date(Reading.created_at)
+    daily = db.session.query(day, func.count(Reading.id)).filter(
+        Reading.user_id == user_id,
+        Reading.created_at >= datetime.combine(_window_start(), datetime.min.time())
+    ).group_by(day).all()
+
+    stats = db.session.get(UserReadingStats, user_id)
+    if stats is None:
+        stats = UserReadingStats(user_id=user_id)
+        db.session.add(stats)
+
+    stats.total_readings = total
+    stats.favorite_readings = favorites
+    stats.set_spread_counts({spread: count for spread, count in spreads})
+    stats.set_daily_counts({str(d): count for d, count in daily})
+    return stats
+
+
+def _adjust(user_id: int, apply):
+    """
+    Aplica `apply(stats)` sobre la fila bloqueada del usuario
+
+    Si la fila aún no existe se crea (sin competir con otra petición que la
+    cree a la vez), se bloquea y se reconstruye; como los cambios de la sesión
+    ya se volcaron, la reconstrucción los incluye.
+    """
+    db.session.flush()
+    stats = _locked_stats(user_id)
+    if stats is None:
+        _ensure_stats_row(user_id)
+        _locked_stats(user_id)
+        rebuild_user_stats(user_id)
+        return
+    apply(stats)
+
+
+def record_reading_created(reading: Reading):
+    """Cuenta una lectura nueva (llamar tras db.session.add)"""
+    day = (reading.created_at or datetime.utcnow()).date().isoformat()
+
+    def apply(stats):
+        stats.total_readings += 1
+        if reading.is_favorite:
+            stats.favorite_readings += 1
+        spreads = dict(stats.get_spread_counts())
+        spreads[reading.spread_type] = spreads.get(reading.spread_type, 0) + 1
+        stats.set_spread_counts(spreads)
+        daily = dict(stats.get_daily_counts())
+        daily[day] = daily.get(day, 0) + 1
+        stats.set_daily_counts(_prune_days(daily))
+
+    _adjust(reading.user_id, apply)
+
+
+def record_reading_deleted(reading: Reading):
+    """Descuenta una lectura borrada (llamar tras db.session.delete)"""
+    day = reading.created_at.date().isoformat() if reading.created_at else None
+
+    def apply(stats):
+        stats.total_readings = max(0, stats.total_readings - 1)
+        if reading.is_favorite:
+            stats.favorite_readings = max(0, stats.favorite_readings - 1)
+        spreads = dict(stats.get_spread_counts())
+        if spreads.get(reading.spread_type):
+            spreads[reading.spread_type] -= 1
+            if not spreads[reading.spread_type]:
+                del spreads[reading.spread_type]
+        stats.set_spread_counts(spreads)
+        daily = dict(stats.get_daily_counts())
+        if day in daily:
+            daily[day] -= 1
+        stats.set_daily_counts(_prune_days(daily))
+
+    _adjust(reading.user_id, apply)
+
+
+def record_favorite_changed(user_id: int, is_favorite: bool):
+    """Ajusta el contador de favoritas tras marcar/desmarcar una lectura"""
+    def apply(stats):
+        delta = 1 if is_favorite else -1
+        stats.favorite_readings = max(0, stats.favorite_readings + delta)
+
+    _adjust(user_id, apply)
+
+
+def get_reading_stats(user_id: int) -> Dict:
+    """
+    Estadísticas de lecturas del usuario (una consulta por clave primaria)
+
+    Si el usuario aún no tiene fila (datos anteriores a la tabla) se calcula
+    y guarda en ese momento.
+    """
+    stats = db.session.get(UserReadingStats, user_id)
+    if stats is None:
+        stats = rebuild_user_stats(user_id)
+        try:
+            db.session.commit()
+        except Exception as e:
+            # Otra petición la creó a la vez: usar la suya
+            db.session.rollback()
+            logger.info("Estadísticas de %s creadas concurrentemente: %s", user_id, e)
+            stats = db.session.get(UserReadingStats, user_id) or rebuild_user_stats(user_id)
+
+    start = _window_start().isoformat()
+    return {
+        'total_readings': stats.total_readings,
+        'favorite_readings': stats.favorite_readings,
+        'recent_readings_7d': sum(
+            count for day, count in stats.get_daily_counts().items() if day >= start
+        ),
+        'spread_distribution': dict(stats.get_spread_counts())
+    }
+
+
+def rebuild_all_stats(batch_size: int = 500) -> int:
+    """Reconstruye las estadísticas de todos los usuarios; devuelve cuántos"""
+    rebuilt = 0
+    last_id = 0
+    while True:
+        user_ids = [row[0] for row in db.session.query(User.id).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(batch_size).all()]
+        if not user_ids:
+            break
+        for user_id in user_ids:
+            rebuild_user_stats(user_id)
+        db.session.commit()
+        rebuilt += len(user_ids)
+        last_id = user_ids[-1]
+    return rebuilt
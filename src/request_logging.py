@@ -0,0 +1,92 @@
+"""
+Registro de peticiones muestreado y asíncrono
+Solo una fracción de las peticiones (REQUEST_LOG_SAMPLE_RATE) se registra,
+además de todos los errores 5xx y las peticiones lentas. El hilo de la
+petición solo encola un diccionario; el formateo a JSON y la escritura los
+hace un QueueListener en segundo plano. Si la cola se llena, los registros se
+descartan y se cuentan.
+"""
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from flask import g, request
+
+LOGGER_NAME = 'tarot.requests'
+
+
+class JSONLineFormatter(logging.Formatter):
+    """Una línea JSON por registro; el mensaje debe ser un diccionario"""
+
+    def format(self, record):
+        payload = record.msg if isinstance(record.msg, dict) else {'message': record.getMessage()}
+        return json.dumps({'ts': round(record.created, 3), 'level': record.levelname, **payload},
+                          ensure_ascii=False, separators=(',', ':'))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que no formatea en el hilo que llama y descarta si la cola está llena"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # El mensaje es un diccionario de valores simples: se formatea en el listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def init_request_logging(app, stream=None):
+    """
+    Registra los hooks de log de peticiones y arranca el listener
+
+    Returns:
+        El DroppingQueueHandler (su atributo `dropped` cuenta los descartes)
+    """
+    sample_rate = float(app.config.get('REQUEST_LOG_SAMPLE_RATE', 0.01))
+    slow_ms = float(app.config.get('REQUEST_LOG_SLOW_MS', 1000))
+
+    log_queue = queue.Queue(maxsize=int(app.config.get('REQUEST_LOG_QUEUE_SIZE', 10000)))
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONLineFormatter())
+    listener = QueueListener(log_queue, output, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+
+    handler = DroppingQueueHandler(log_queue)
+    request_logger = logging.getLogger(LOGGER_NAME)
+    request_logger.handlers = [handler]
+    request_logger.setLevel(logging.INFO)
+    request_logger.propagate = False
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def log_response(response):
+        started = g.get('_request_started')
+        duration_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        status = response.status_code
+        if status >= 500 or duration_ms >= slow_ms or random.random() < sample_rate:
+            request_logger.log(logging.ERROR if status >= 500 else logging.INFO, {
+                'method': request.method,
+                'path': request.path,
+                'status': status,
+                'duration_ms': round(duration_ms, 1),
+                'remote_addr': request.remote_addr,
+                'sampled': status < 500 and duration_ms < slow_ms
+            })
+        return response
+
+    return handler
@@ -0,0 +1,223 @@
+"""
+Actualizaciones de esquema idempotentes
+`db.create_all()` crea las tablas que faltan pero no modifica las existentes;
+estos pasos ajustan bases de datos creadas con versiones anteriores.
+
+Uso:
+    flask --app app upgrade-schema
+"""
+from typing import Callable, Dict, List
+import logging
+from sqlalchemy import inspect, text
+from src.models import Reading, User, db
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaUpgradeError(Exception):
+    """Un paso no puede aplicarse sin intervención manual sobre los datos"""
+
+# Columnas JSONText por tabla (JSONB nativo en PostgreSQL)
+JSON_COLUMNS: Dict[str, List[str]] = {
+    'readings': ['cards_data'],
+    'birth_charts': [
+        'planetary_positions',
+        'houses_data',
+        'aspects_data',
+        'chart_summary',
+        'interpretations'
+    ]
+}
+
+
+def upgrade_json_columns() -> List[str]:
+    """
+    Convierte a JSONB las columnas JSON que siguen siendo TEXT en PostgreSQL
+
+    En otros motores no hace nada: allí JSONText se almacena como TEXT.
+
+    Returns:
+        Columnas convertidas ('tabla.columna')
+    """
+    engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        return []
+
+    inspector = inspect(engine)
+    converted = []
+    with engine.begin() as conn:
+        for table, columns in JSON_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            current = {col['name']: col['type'] for col in inspector.get_columns(table)}
+            for column in columns:
+                if column not in current or current[column].__visit_name__.upper() == 'JSONB':
+                    continue
+                conn.execute(text(
+                    f'ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb'
+                ))
+                converted.append(f'{table}.{column}')
+    return converted
+
+
+def add_username_lower() -> List[str]:
+    """
+    Añade y rellena users.username_lower en bases de datos anteriores
+
+    El relleno se hace en Python con User.normalize_username para que coincida
+    exactamente con lo que escribe el modelo.
+
+    Returns:
+        Cambios aplicados
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    if not inspector.has_table('users'):
+        return []
+
+    changes = []
+    columns = {col['name'] for col in inspector.get_columns('users')}
+    with engine.begin() as conn:
+        if 'username_lower' not in columns:
+            conn.execute(text('ALTER TABLE users ADD COLUMN username_lower VARCHAR(80)'))
+            changes.append('users.username_lower')
+
+        rows = conn.execute(text(
+            'SELECT id, username FROM users WHERE username_lower IS NULL'
+        )).all()
+        if rows:
+            conn.execute(
+                text('UPDATE users SET username_lower = :value WHERE id = :id'),
+                [{'id': row.id, 'value': User.normalize_username(row.username)} for row in rows]
+            )
+            changes.append(f'users.username_lower: {len(rows)} filas rellenadas')
+    return changes
+
+
+def find_username_collisions(conn) -> Dict[str, List[int]]:
+    """Usernames que solo difieren en mayúsculas: username_lower -> ids"""
+    rows = conn.execute(text(
+        'SELECT username_lower, id FROM users WHERE username_lower IN ('
+        '  SELECT username_lower FROM users WHERE username_lower IS NOT NULL'
+        '  GROUP BY username_lower HAVING COUNT(*) > 1'
+        ') ORDER BY username_lower, id'
+    )).all()
+    collisions: Dict[str, List[int]] = {}
+    for row in rows:
+        collisions.setdefault(row.username_lower, []).append(row.id)
+    return collisions
+
+
+def make_username_lower_unique() -> List[str]:
+    """
+    Convierte en único el índice de users.username_lower
+
+    Las bases de datos anteriores lo tienen sin UNIQUE, y el relleno de
+    add_username_lower puede haber dejado usuarios que solo difieren en
+    mayúsculas. Esos duplicados se comprueban antes de crear el índice.
+
+    Returns:
+        Cambios aplicados
+
+    Raises:
+        SchemaUpgradeError: Si hay duplicados; hay que renombrar esos usuarios
+            y volver a ejecutar la actualización
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    if not inspector.has_table('users'):
+        return []
+    if 'username_lower' not in {col['name'] for col in inspector.get_columns('users')}:
+        return []
+
+    index = next(index for index in User.__table__.indexes if list(index.columns.keys()) == ['username_lower'])
+    existing = {entry['name']: entry for entry in inspector.get_indexes('users')}
+    if existing.get(index.name, {}).get('unique'):
+        return []
+
+    with engine.begin() as conn:
+        collisions = find_username_collisions(conn)
+        if collisions:
+            details = '; '.join(
+                f"'{name}': ids {', '.join(str(user_id) for user_id in ids)}"
+                for name, ids in collisions.items()
+            )
+            raise SchemaUpgradeError(
+                f'Usernames que solo difieren en mayúsculas (renómbralos antes de continuar): {details}'
+            )
+
+        if index.name in existing:
+            conn.execute(text(f'DROP INDEX {index.name}'))
+        index.create(bind=conn)
+    return [f'{index.name} (UNIQUE)']
+
+
+def add_reading_updated_at() -> List[str]:
+    """
+    Añade readings.updated_at (validador de la ETag del historial) y lo rellena
+    con created_at en las filas anteriores
+
+    Returns:
+        Cambios aplicados
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    if not inspector.has_table('readings'):
+        return []
+
+    changes = []
+    columns = {col['name'] for col in inspector.get_columns('readings')}
+    with engine.begin() as conn:
+        if 'updated_at' not in columns:
+            column_type = Reading.__table__.c.updated_at.type.compile(dialect=engine.dialect)
+            conn.execute(text(f'ALTER TABLE readings ADD COLUMN updated_at {column_type}'))
+            changes.append('readings.updated_at')
+
+        filled = conn.execute(text(
+            'UPDATE readings SET updated_at = created_at WHERE updated_at IS NULL'
+        )).rowcount
+        if filled:
+            changes.append(f'readings.updated_at: {filled} filas rellenadas')
+    return changes
+
+
+def create_missing_indexes() -> List[str]:
+    """
+    Crea los índices declarados en los modelos que falten en tablas existentes
+
+    Returns:
+        Índices creados
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            index.create(bind=engine)
+            created.append(index.name)
+    return created
+
+
+UPGRADES: List[Callable[[], List[str]]] = [
+    upgrade_json_columns,
+    add_username_lower,
+    make_username_lower_unique,
+    add_reading_updated_at,
+    create_missing_indexes,
+]
+
+
+def run_upgrades() -> List[str]:
+    """Ejecuta todos los pasos en orden; devuelve los cambios aplicados"""
+    applied = []
+    for step in UPGRADES:
+        changes = step()
+        for change in changes:
+            logger.info("Esquema actualizado (%s): %s", step.__name__, change)
+        applied.extend(changes)
+    return applied
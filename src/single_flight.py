@@ -0,0 +1,70 @@
+"""
+Deduplicación de llamadas concurrentes idénticas (single-flight)
+El primer llamador ejecuta la función; los demás con la misma clave esperan su resultado
+"""
+from concurrent.futures import Future
+from typing import Callable, Dict
+import hashlib
+import re
+import threading
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_key(text: str, *extra) -> str:
+    """
+    Clave estable para un prompt: espacios colapsados más parámetros extra
+
+    Args:
+        text: Prompt a normalizar
+        extra: Valores que también distinguen la llamada (backend, límites, etc.)
+    """
+    normalized = _WHITESPACE.sub(' ', text).strip()
+    parts = [normalized] + [repr(value) for value in extra]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Colapsa llamadas simultáneas con la misma clave en una sola ejecución"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._stats = {'executions': 0, 'shared': 0}
+
+    def do(self, key: str, fn: Callable):
+        """
+        Ejecuta `fn` o espera la ejecución en curso con la misma clave
+
+        Los llamadores que esperan reciben el mismo resultado o la misma
+        excepción que el llamador que ejecutó la función.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._stats['executions'] += 1
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def metrics(self) -> Dict:
+        """Ejecuciones reales, llamadas compartidas y claves en vuelo"""
+        with self._lock:
+            return dict(self._stats, in_flight_keys=len(self._calls))
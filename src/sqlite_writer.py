@@ -0,0 +1,229 @@
+"""
+Escritor único para SQLite con commit agrupado (group commit)
+SQLite admite un solo escritor a la vez: con varias conexiones escribiendo,
+cada una compite por el bloqueo y reintenta con esperas (busy_timeout). En
+este modo las escrituras de las rutas calientes (alta de lecturas, cupos,
+último login) se encolan como unidades de trabajo y las ejecuta un único hilo
+con su propia conexión: cada lote de unidades va en una transacción
+(BEGIN IMMEDIATE) con un SAVEPOINT por unidad y un solo COMMIT.
+
+Las lecturas siguen en el pool normal, que en modo WAL no espera al escritor.
+
+Una unidad es una función sin argumentos que usa `db.session` como siempre (en
+el hilo escritor la sesión está ligada a la conexión de escritura) y devuelve
+datos simples, no objetos ORM. Sin el modo activo, `run()` ejecuta la unidad
+en la sesión actual y hace commit, así que el código que la llama es el mismo
+con cualquier motor.
+"""
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+import atexit
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.models import db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SQLiteWriter:
+    """
+    Cola de escritura servida por un único hilo
+
+    Se inicializa como las extensiones de Flask (`sqlite_writer.init_app(app)`,
+    después de `db.init_app`) y solo se activa con SQLITE_WRITER_QUEUE y una
+    base de datos SQLite de archivo.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.active = False
+        self.batch_size = 64
+        self.max_delay = 0.002
+        self.timeout = 30.0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._engine = None
+        self._connection = None
+        self._session: Optional[Session] = None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {'units': 0, 'failed_units': 0, 'batches': 0, 'batch_max': 0, 'commit_time_total': 0.0}
+
+    def init_app(self, app):
+        if not app.config.get('SQLITE_WRITER_QUEUE'):
+            return
+
+        with app.app_context():
+            url = db.engine.url
+        if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+            logger.info("SQLITE_WRITER_QUEUE ignorado: la base de datos no es un archivo SQLite")
+            return
+
+        self.app = app
+        self.batch_size = max(1, int(app.config.get('SQLITE_WRITER_BATCH_SIZE', self.batch_size)))
+        self.max_delay = max(0.0, float(app.config.get('SQLITE_WRITER_MAX_DELAY_MS', 2)) / 1000)
+        self.timeout = float(app.config.get('SQLITE_WRITER_TIMEOUT_SECONDS', self.timeout))
+
+        self._engine = create_engine(url, poolclass=NullPool)
+
+        @event.listens_for(self._engine, 'connect')
+        def disable_pysqlite_transactions(dbapi_connection, connection_record):
+            # Transacciones explícitas: pysqlite no emite su propio BEGIN
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(self._engine, 'begin')
+        def begin_immediate(connection):
+            # Toma el bloqueo de escritura al empezar, no al primer INSERT
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self.active = True
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def run(self, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+        """
+        Ejecuta `fn` en una transacción de escritura confirmada y devuelve su resultado
+
+        Raises:
+            La excepción de `fn` (solo se deshace su unidad) o del COMMIT del lote
+        """
+        if not self.active:
+            try:
+                result = fn()
+                db.session.commit()
+                return result
+            except Exception:
+                db.session.rollback()
+                raise
+
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future.result(timeout=timeout or self.timeout)
+
+    def _run(self):
+        with self.app.app_context():
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.batch_size:
+                    try:
+                        remaining = deadline - time.monotonic()
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._execute(batch)
+
+            # Unidades encoladas mientras se paraba
+            leftover = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    leftover.append(item)
+            if leftover:
+                self._execute(leftover)
+
+    def _writer_session(self) -> Session:
+        if self._session is None:
+            self._connection = self._engine.connect()
+            self._session = Session(bind=self._connection, expire_on_commit=False)
+            # db.session y Model.query de este hilo usan la conexión de escritura
+            db.session.registry.set(self._session)
+        return self._session
+
+    def _reset_connection(self):
+        try:
+            if self._session is not None:
+                self._session.close()
+            if self._connection is not None:
+                self._connection.close()
+        except Exception as e:
+            logger.warning("Cierre de la conexión de escritura falló: %s", e)
+        self._session = None
+        self._connection = None
+
+    def _execute(self, batch: List[Tuple[Callable, Future]]):
+        outcomes = []
+        try:
+            session = self._writer_session()
+            for fn, future in batch:
+                try:
+                    with session.begin_nested():
+                        outcomes.append((future, fn(), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+
+            started = time.perf_counter()
+            session.commit()
+            commit_time = time.perf_counter() - started
+            session.close()
+        except Exception as e:
+            logger.error("Lote de escritura SQLite falló: %s", e)
+            self._reset_connection()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            self._record(len(batch), len(batch), 0.0)
+            return
+
+        failed = 0
+        for future, result, error in outcomes:
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        self._record(len(batch), failed, commit_time)
+
+    def _record(self, units: int, failed: int, commit_time: float):
+        with self._metrics_lock:
+            m = self._metrics
+            m['units'] += units
+            m['failed_units'] += failed
+            m['batches'] += 1
+            m['batch_max'] = max(m['batch_max'], units)
+            m['commit_time_total'] += commit_time
+
+    def metrics(self) -> Dict:
+        """Unidades, lotes (tamaño medio y máximo) y tiempo medio de COMMIT"""
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        return {
+            'active': self.active,
+            'queued': self._queue.qsize(),
+            'units': m['units'],
+            'failed_units': m['failed_units'],
+            'batches': m['batches'],
+            'batch_avg': round(m['units'] / m['batches'], 2) if m['batches'] else 0.0,
+            'batch_max': m['batch_max'],
+            'commit_avg_ms': round(m['commit_time_total'] / m['batches'] * 1000, 3) if m['batches'] else 0.0
+        }
+
+    def stop(self):
+        """Procesa lo encolado y detiene el hilo; después run() escribe en el hilo que llama"""
+        if not self.active:
+            return
+        self.active = False
+        self._queue.put(None)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.timeout)
+
+
+sqlite_writer = SQLiteWriter()
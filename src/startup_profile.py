@@ -0,0 +1,237 @@
+"""
+Perfil de importación y presupuesto de arranque en frío
+En serverless cada instancia nueva importa la app antes de atender su primera
+petición, así que ese tiempo se suma a la latencia de cola (p99). Cada medida
+se toma en un intérprete nuevo, como una instancia recién creada.
+
+- profile_imports(): tiempos por módulo de `python -X importtime`.
+- measure_cold_start(): importación de la app + primera petición a
+  /api/health, comparado con COLD_START_BUDGET_MS. También comprueba que los
+  módulos de carga diferida (swisseph, pytz, Gemini) siguen sin importarse.
+- find_undefined_names(): nombres globales que una función usa y que su módulo
+  no define ni importa. Con las importaciones dentro de las vistas, olvidar
+  una solo falla (NameError) cuando se ejecuta esa rama; esta comprobación la
+  detecta sin ejecutar nada y forma parte del benchmark.
+
+Uso:
+    flask --app app import-profile [--module api.index] [--top 25]
+    flask --app app cold-start-benchmark [--runs 5]
+    python -m src.startup_profile benchmark [--runs 5]
+    python -m src.startup_profile names
+"""
+from typing import Dict, List, Optional
+import builtins
+import glob
+import json
+import os
+import statistics
+import subprocess
+import symtable
+import sys
+from config import Config
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULE = 'api.index'
+
+# Módulos que solo deben cargarse en la primera petición que los usa
+LAZY_MODULES = (
+    'swisseph',
+    'pytz',
+    'google.generativeai',
+    'src.astrology_calculator',
+    'src.gemini_service'
+)
+
+# Código de la app revisado por find_undefined_names (relativo a la raíz)
+SOURCE_GLOBS = ('app.py', 'config.py', 'api/*.py', 'routes/*.py', 'src/*.py')
+
+# Definidos por el intérprete en todo módulo
+_MODULE_ATTRIBUTES = frozenset({
+    '__builtins__', '__doc__', '__file__', '__loader__', '__name__', '__package__', '__path__', '__spec__'
+})
+
+_COLD_START_SCRIPT = '''
+import importlib, json, logging, sys, time
+logging.disable(logging.CRITICAL)
+started = time.perf_counter()
+app = importlib.import_module(sys.argv[1]).app
+imported = time.perf_counter()
+status = app.test_client().get('/api/health').status_code
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (finished - imported) * 1000,
+    'status': status,
+    'lazy_loaded': [name for name in sys.argv[2:] if name in sys.modules]
+}))
+'''
+
+
+def _run_python(args: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=False
+    )
+
+
+def profile_imports(module: str = DEFAULT_MODULE, top: int = 25) -> Dict:
+    """
+    Módulos que más tardan en importarse al cargar `module`
+
+    Returns:
+        total_ms (importación completa de `module`) y modules: los `top` con
+        mayor tiempo acumulado (module, self_ms, cumulative_ms)
+    """
+    result = _run_python(['-X', 'importtime', '-c', f'import {module}'])
+    if result.returncode != 0:
+        raise RuntimeError(f'No se pudo importar {module}: {result.stderr.strip().splitlines()[-1:]}')
+
+    modules = []
+    total_ms = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entry = {
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        }
+        modules.append(entry)
+        if entry['module'] == module:
+            total_ms = entry['cumulative_ms']
+
+    modules.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+    return {'module': module, 'total_ms': total_ms, 'modules': modules[:top]}
+
+
+def _undefined_in_file(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        module = symtable.symtable(f.read(), path, 'exec')
+
+    known = {
+        symbol.get_name() for symbol in module.get_symbols()
+        if symbol.is_assigned() or symbol.is_imported()
+    } | set(dir(builtins)) | _MODULE_ATTRIBUTES
+
+    undefined = []
+    pending = list(module.get_children())
+    while pending:
+        table = pending.pop()
+        pending.extend(table.get_children())
+        if table.get_type() != 'function':
+            continue
+        for symbol in table.get_symbols():
+            if symbol.is_global() and symbol.is_referenced() and symbol.get_name() not in known:
+                undefined.append({
+                    'file': os.path.relpath(path, PROJECT_ROOT),
+                    'line': table.get_lineno(),
+                    'function': table.get_name(),
+                    'name': symbol.get_name()
+                })
+    return undefined
+
+
+def find_undefined_names(patterns=SOURCE_GLOBS) -> List[Dict]:
+    """
+    Nombres globales usados en funciones que su módulo no define ni importa
+
+    Returns:
+        Una entrada por nombre (file, line de la función, function, name)
+    """
+    paths = sorted({path for pattern in patterns for path in glob.glob(os.path.join(PROJECT_ROOT, pattern))})
+    undefined = [entry for path in paths for entry in _undefined_in_file(path)]
+    return sorted(undefined, key=lambda entry: (entry['file'], entry['line'], entry['name']))
+
+
+def measure_cold_start(module: str = DEFAULT_MODULE, runs: int = 5,
+                       budget_ms: Optional[float] = None) -> Dict:
+    """
+    Arranque en frío medido en `runs` intérpretes nuevos
+
+    Returns:
+        Tiempos por ejecución, mediana y máximo (importación + primera
+        petición), el presupuesto, within_budget (según la mediana) y los
+        módulos de LAZY_MODULES que se cargaron indebidamente; también falla
+        (within_budget False) si find_undefined_names encuentra algún nombre
+    """
+    budget_ms = Config.COLD_START_BUDGET_MS if budget_ms is None else budget_ms
+
+    samples = []
+    for _ in range(max(1, runs)):
+        result = _run_python(['-c', _COLD_START_SCRIPT, module, *LAZY_MODULES])
+        if result.returncode != 0:
+            raise RuntimeError(f'Fallo al arrancar {module}: {result.stderr.strip().splitlines()[-1:]}')
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    totals = [sample['import_ms'] + sample['first_request_ms'] for sample in samples]
+    median_ms = statistics.median(totals)
+    lazy_loaded = sorted({name for sample in samples for name in sample['lazy_loaded']})
+    undefined = find_undefined_names()
+    return {
+        'module': module,
+        'runs': [
+            {'import_ms': round(s['import_ms'], 1), 'first_request_ms': round(s['first_request_ms'], 1)}
+            for s in samples
+        ],
+        'median_ms': round(median_ms, 1),
+        'max_ms': round(max(totals), 1),
+        'budget_ms': budget_ms,
+        'within_budget': median_ms <= budget_ms and not lazy_loaded and not undefined,
+        'lazy_loaded': lazy_loaded,
+        'undefined_names': undefined
+    }
+
+
+def format_cold_start(report: Dict) -> List[str]:
+    """Líneas legibles de un informe de measure_cold_start"""
+    lines = [
+        f"{'✅' if report['within_budget'] else '❌'} {report['module']}: mediana {report['median_ms']} ms, "
+        f"máximo {report['max_ms']} ms (presupuesto {report['budget_ms']} ms)"
+    ]
+    for i, run in enumerate(report['runs'], 1):
+        lines.append(f"   #{i}: importación {run['import_ms']} ms + primera petición {run['first_request_ms']} ms")
+    if report['lazy_loaded']:
+        lines.append(f"   Módulos diferidos cargados al arrancar: {', '.join(report['lazy_loaded'])}")
+    lines.extend(format_undefined_names(report.get('undefined_names', [])))
+    return lines
+
+
+def format_undefined_names(undefined: List[Dict]) -> List[str]:
+    return [
+        f"   Nombre no definido: {entry['name']} en {entry['function']}() ({entry['file']}:{entry['line']})"
+        for entry in undefined
+    ]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Perfil de importación y presupuesto de arranque en frío')
+    parser.add_argument('--module', default=DEFAULT_MODULE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    imports = subparsers.add_parser('imports', help='Módulos más lentos de importar')
+    imports.add_argument('--top', type=int, default=25)
+    benchmark = subparsers.add_parser('benchmark', help='Arranque en frío frente a COLD_START_BUDGET_MS')
+    benchmark.add_argument('--runs', type=int, default=5)
+    benchmark.add_argument('--budget-ms', type=float, default=None)
+    subparsers.add_parser('names', help='Nombres no definidos en funciones (importaciones diferidas olvidadas)')
+    args = parser.parse_args()
+
+    if args.command == 'imports':
+        profile = profile_imports(args.module, args.top)
+        print(f"{profile['module']}: {profile['total_ms']:.1f} ms")
+        for entry in profile['modules']:
+            print(f"{entry['cumulative_ms']:10.1f} ms {entry['self_ms']:10.1f} ms  {entry['module']}")
+    elif args.command == 'names':
+        undefined = find_undefined_names()
+        print('\n'.join(format_undefined_names(undefined)) or '✅ Sin nombres no definidos')
+        sys.exit(1 if undefined else 0)
+    else:
+        report = measure_cold_start(args.module, args.runs, args.budget_ms)
+        print('\n'.join(format_cold_start(report)))
+        sys.exit(0 if report['within_budget'] else 1)
@@ -23,6 +23,12 @@ from dataclasses import dataclass
 from enum import Enum
 from tarot_secure_random import TarotSecureShuffler
 
+# Corpus de interpretaciones precalculadas (importable como paquete o como script)
+try:
+    from src.interpretation_corpus import interpretar_posiciones
+except ImportError:
+    from interpretation_corpus import interpretar_posiciones
+
 
 class TipoTirada(Enum):
     """Tipos de tiradas disponibles"""
@@ -546,6 +552,14 @@ class LectorTarot:
         """Genera una interpretación general basada en las cartas"""
         cartas = lectura["cartas"]
         
+        # Textos precalculados por carta y posición (sin llamadas de red)
+        textos_corpus = interpretar_posiciones(cartas, tipo_tirada.value)
+        if textos_corpus:
+            return " ".join(
+                f"{c['posicion']} ({c['carta']}): {texto}"
+                for c, texto in zip(cartas, textos_corpus)
+            )
+        
         if tipo_tirada == TipoTirada.UNA_CARTA:
             return f"La carta {cartas[0]['carta']} te invita a reflexionar sobre {cartas[0]['significado'].lower()}. Es un momento para considerar {', '.join(cartas[0]['palabras_clave'][:2])}."
         
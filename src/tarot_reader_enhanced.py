@@ -16,6 +16,12 @@ from dataclasses import dataclass
 from enum import Enum
 import secrets  # Para aleatorización criptográficamente segura
 
+# Corpus de interpretaciones precalculadas (importable como paquete o como script)
+try:
+    from src.interpretation_corpus import interpretar_posiciones
+except ImportError:
+    from interpretation_corpus import interpretar_posiciones
+
 
 class TipoTirada(Enum):
     """Tipos de tiradas disponibles"""
@@ -694,8 +700,17 @@ class LectorTarot:
         
         interpretacion_base = ""
         
+        # Textos precalculados por carta y posición (sin llamadas de red)
+        textos_corpus = interpretar_posiciones(cartas, tipo_tirada.value)
+        
         # Interpretaciones específicas por tipo
-        if tipo_tirada == TipoTirada.UNA_CARTA:
+        if textos_corpus:
+            interpretacion_base = " ".join(
+                f"{c['posicion']} ({c['carta']}): {texto}"
+                for c, texto in zip(cartas, textos_corpus)
+            )
+        
+        elif tipo_tirada == TipoTirada.UNA_CARTA:
             c = cartas[0]
             interpretacion_base = f"La carta {c['carta']} "
             if c["invertida"]:
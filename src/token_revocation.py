@@ -0,0 +1,167 @@
+"""
+Revocación de tokens JWT
+Los JTI revocados se guardan en la tabla revoked_tokens y cada proceso mantiene
+un filtro de Bloom con ellos, refrescado de forma incremental. El caso común
+(token no revocado) se resuelve con una comprobación en memoria; solo un
+positivo del filtro se confirma con una consulta puntual por JTI.
+
+Un token revocado en otro proceso se rechaza aquí, como mucho,
+TOKEN_REVOCATION_REFRESH_SECONDS después.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import hashlib
+import logging
+import math
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from src.cache import TTLCache
+from src.models import RevokedToken, db
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Margen al pedir revocaciones nuevas: cubre transacciones confirmadas tarde y
+# pequeñas diferencias de reloj entre procesos
+_REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre cadenas (sin falsos negativos)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, int(capacity))
+        bits = math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.size = max(8, bits)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class TokenRevocationList:
+    """Lista de JTI revocados con filtro de Bloom en memoria"""
+
+    def __init__(self, refresh_interval: float, capacity: int, error_rate: float):
+        self.refresh_interval = refresh_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom: Optional[BloomFilter] = None
+        self._loaded_until: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        # Resultado confirmado en base de datos para los positivos del filtro
+        self._confirmed = TTLCache(maxsize=10000, ttl=max(refresh_interval, 1.0) * 12)
+
+    def _refresh(self, force: bool = False):
+        if not force and time.monotonic() < self._next_refresh:
+            return
+        with self._lock:
+            if not force and time.monotonic() < self._next_refresh:
+                return
+
+            now = datetime.utcnow()
+            active = select(RevokedToken.jti).where(RevokedToken.expires_at > now)
+            bloom = self._bloom
+            rebuild = force or bloom is None
+            if not rebuild:
+                recent = db.session.execute(
+                    active.where(RevokedToken.revoked_at >= self._loaded_until - _REFRESH_OVERLAP)
+                ).scalars().all()
+                # Las del margen de solapamiento ya están en el filtro
+                new = [jti for jti in recent if jti not in bloom]
+                rebuild = bloom.count + len(new) > bloom.capacity
+
+            if rebuild:
+                # Carga completa (o filtro lleno): solo tokens vigentes, con holgura
+                recent = new = db.session.execute(active).scalars().all()
+                self.capacity = max(self.capacity, len(new) * 2)
+                bloom = BloomFilter(self.capacity, self.error_rate)
+
+            for jti in new:
+                bloom.add(jti)
+            for jti in recent:
+                self._confirmed.delete(jti)
+
+            self._bloom = bloom
+            self._loaded_until = now
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def is_revoked(self, jti: str) -> bool:
+        """True si el token con este JTI fue revocado"""
+        self._refresh()
+        if jti not in self._bloom:
+            return False
+
+        revoked = self._confirmed.get(jti)
+        if revoked is None:
+            revoked = db.session.execute(
+                select(RevokedToken.id).where(RevokedToken.jti == jti)
+            ).first() is not None
+            self._confirmed.set(jti, revoked)
+        return revoked
+
+    def revoke(self, jwt_payload: dict):
+        """
+        Revoca el token descrito por sus claims decodificados (jti, type, sub, exp)
+
+        Confirma la transacción actual. Revocar dos veces el mismo token no falla.
+        """
+        jti = jwt_payload['jti']
+        expires_at = datetime.fromtimestamp(jwt_payload['exp'], tz=timezone.utc).replace(tzinfo=None)
+        user_id = jwt_payload.get('sub')
+
+        db.session.add(RevokedToken(
+            jti=jti,
+            token_type=jwt_payload.get('type', 'access'),
+            user_id=int(user_id) if user_id is not None else None,
+            expires_at=expires_at
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+        self._refresh()
+        with self._lock:
+            self._bloom.add(jti)
+        self._confirmed.set(jti, True)
+
+    def purge_expired(self) -> int:
+        """Borra las revocaciones de tokens ya expirados; devuelve cuántas"""
+        deleted = RevokedToken.query.filter(
+            RevokedToken.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        self._refresh(force=True)
+        return deleted
+
+    def reset(self):
+        """Descarta el estado en memoria; se recarga en la siguiente comprobación"""
+        with self._lock:
+            self._bloom = None
+            self._loaded_until = None
+            self._next_refresh = 0.0
+        self._confirmed.clear()
+
+
+token_revocation = TokenRevocationList(
+    refresh_interval=Config.TOKEN_REVOCATION_REFRESH_SECONDS,
+    capacity=Config.TOKEN_REVOCATION_BLOOM_CAPACITY,
+    error_rate=Config.TOKEN_REVOCATION_BLOOM_ERROR_RATE
+)
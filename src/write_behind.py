@@ -0,0 +1,50 @@
+"""
+Utilidades de escritura diferida (write-behind)
+Hilo en segundo plano que ejecuta una función de volcado periódicamente y al apagar
+"""
+import atexit
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    """Ejecuta `flush_fn` cada `interval` segundos y una última vez al salir del proceso"""
+
+    def __init__(self, name: str, interval: float, flush_fn: Callable[[], None]):
+        self.name = name
+        self.interval = max(0.1, float(interval))
+        self.flush_fn = flush_fn
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Arranca el hilo (idempotente) y registra el volcado final con atexit"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush_now()
+
+    def flush_now(self):
+        """Vuelca inmediatamente; los errores se registran y no detienen el hilo"""
+        try:
+            self.flush_fn()
+        except Exception as e:
+            logger.error("Volcado '%s' falló: %s", self.name, e)
+
+    def stop(self):
+        """Detiene el hilo y hace un último volcado"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.interval)
+        self.flush_now()
@@ -0,0 +1,131 @@
+"""
+Benchmark de escritura concurrente en SQLite
+Crea lecturas desde varios hilos contra POST /api/readings/ (JWT, cupo,
+estadísticas y la lectura, como en producción) sobre una base de datos SQLite
+temporal, con y sin el escritor único (SQLITE_WRITER_QUEUE). Cada modo corre
+en un proceso nuevo.
+
+Uso:
+    python -m src.write_benchmark [--threads 8] [--readings 50]
+"""
+from typing import Dict
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_mode(threads: int, readings: int) -> Dict:
+    """Ejecuta la carga en este proceso (configurado por variables de entorno)"""
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from api.index import app
+    from src.auth import create_user_access_token
+    from src.models import User, db
+
+    with app.app_context():
+        db.create_all()
+        tokens = []
+        for i in range(threads):
+            user = User(
+                email=f'bench{i}@example.com',
+                username=f'bench{i}',
+                password_hash='-',
+                subscription_plan='premium'
+            )
+            db.session.add(user)
+            db.session.flush()
+            tokens.append(create_user_access_token(user))
+        db.session.commit()
+
+    payload = {
+        'spread_type': 'tres_cartas',
+        'question': '¿Qué me depara el futuro?',
+        'cards': [{'name': 'El Loco', 'position': i, 'reversed': False} for i in range(3)]
+    }
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def worker(token):
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        start.wait()
+        for _ in range(readings):
+            status = client.post('/api/readings/', headers=headers, json=payload).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    workers = [threading.Thread(target=worker, args=(token,)) for token in tokens]
+    for t in workers:
+        t.start()
+    start.wait()
+    started = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    from src.sqlite_writer import sqlite_writer
+    created = statuses.get(201, 0)
+    return {
+        'writer_queue': sqlite_writer.active,
+        'threads': threads,
+        'requests': threads * readings,
+        'created': created,
+        'errors': {str(code): count for code, count in statuses.items() if code != 201},
+        'seconds': round(elapsed, 3),
+        'readings_per_second': round(created / elapsed, 1) if elapsed else 0.0,
+        'writer': sqlite_writer.metrics()
+    }
+
+
+def run_benchmark(threads: int = 8, readings: int = 50) -> Dict[str, Dict]:
+    """Resultados sin y con el escritor único, cada uno en su propia base de datos"""
+    results = {}
+    for mode, enabled in (('pool', 'false'), ('writer_queue', 'true')):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                SQLITE_WRITER_QUEUE=enabled,
+                QUOTA_BACKEND='database',
+                LAST_LOGIN_FLUSH_INTERVAL_SECONDS='0'
+            )
+            result = subprocess.run(
+                [sys.executable, '-m', 'src.write_benchmark', '--child',
+                 '--threads', str(threads), '--readings', str(readings)],
+                cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=False
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f'Benchmark {mode} falló: {result.stderr.strip().splitlines()[-1:]}')
+            results[mode] = json.loads(result.stdout.strip().splitlines()[-1])
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de creación concurrente de lecturas en SQLite')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--readings', type=int, default=50, help='Lecturas por hilo')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_mode(args.threads, args.readings)))
+        sys.exit(0)
+
+    for mode, result in run_benchmark(args.threads, args.readings).items():
+        errors = ', '.join(f'{code}: {count}' for code, count in result['errors'].items()) or 'ninguno'
+        print(f"{mode:>13}: {result['readings_per_second']:8.1f} lecturas/s "
+              f"({result['created']}/{result['requests']} en {result['seconds']} s, errores: {errors})")
+        if result['writer_queue']:
+            writer = result['writer']
+            print(f"{'':>13}  lotes: {writer['batches']}, tamaño medio {writer['batch_avg']}, "
+                  f"máximo {writer['batch_max']}, COMMIT medio {writer['commit_avg_ms']} ms")
@@ -0,0 +1,5 @@
+"""Configuración común de pytest: la raíz del proyecto en sys.path"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+"""
+Pruebas del servicio de interpretaciones (sin red: backend stub)
+"""
+import pytest
+from src.gemini_service import GeminiAstrologyService, InterpretationError
+from src.interpretation_backends import StubBackend
+from src.rate_limiter import RateLimitedCaller
+
+CHART_DATA = {
+    'houses': {
+        'ascendant': {'sign': 'Aries', 'degree_in_sign': 12.5},
+        'midheaven': {'sign': 'Capricornio', 'degree_in_sign': 3.25}
+    },
+    'aspects': [],
+    'chart_summary': {'sun_sign': 'Leo', 'moon_sign': 'Tauro', 'dominant_element': 'Fuego'}
+}
+
+
+class CountingBackend(StubBackend):
+    """Stub que cuenta las llamadas y puede responder texto no JSON"""
+
+    def __init__(self, response=None):
+        super().__init__()
+        self.response = response
+        self.calls = 0
+
+    def generate(self, prompt, max_output_tokens=None, json_keys=None):
+        self.calls += 1
+        if self.response is not None:
+            return self.response
+        return super().generate(prompt, max_output_tokens=max_output_tokens, json_keys=json_keys)
+
+
+def saturated_limiter():
+    """Limitador sin fichas disponibles que rechaza sin esperar"""
+    limiter = RateLimitedCaller(
+        rate=0.001,
+        burst=1,
+        initial_concurrency=1,
+        max_concurrency=1,
+        latency_target=1.0,
+        acquire_timeout=0
+    )
+    assert limiter.bucket.acquire(0)
+    return limiter
+
+
+def test_batched_reading_does_not_fan_out_when_limiter_is_saturated():
+    backend = CountingBackend()
+    service = GeminiAstrologyService(backend=backend)
+    service.limiter = saturated_limiter()
+
+    with pytest.raises(InterpretationError, match='saturado'):
+        service.generate_personalized_reading(CHART_DATA, mode='batched')
+
+    # Solo el intento en lote: ninguna llamada por sección
+    assert service.limiter.metrics()['calls'] == 1
+    assert backend.calls == 0
+
+
+def test_batched_reading_falls_back_to_sections_on_malformed_response():
+    backend = CountingBackend(response='Esto no es JSON')
+    service = GeminiAstrologyService(backend=backend)
+
+    reading = service.generate_personalized_reading(CHART_DATA, mode='batched')
+
+    # El lote y después una llamada por sección (ascendant, midheaven, summary)
+    assert backend.calls == 1 + 3
+    assert list(reading) == ['ascendant', 'midheaven', 'summary']
+
+
+def test_stub_backend_bypasses_the_gemini_limiter():
+    from src.gemini_service import get_gemini_limiter
+
+    service = GeminiAstrologyService(backend=StubBackend())
+    calls_before = get_gemini_limiter().metrics()['calls']
+
+    # Más llamadas que la ráfaga del limitador de Gemini, sin esperas
+    for degree in range(20):
+        service.interpret_ascendant('Aries', float(degree))
+
+    assert service.limiter is None
+    assert get_gemini_limiter().metrics()['calls'] == calls_before
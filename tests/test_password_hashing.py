@@ -0,0 +1,20 @@
+"""
+Pruebas del servicio de hash de contraseñas (en el hilo: workers=0)
+"""
+from werkzeug.security import generate_password_hash
+from src.password_hashing import PasswordHasher
+
+
+def test_fresh_hash_with_shorthand_method_does_not_need_rehash():
+    hasher = PasswordHasher(method='scrypt', workers=0)
+
+    assert not hasher.needs_rehash(hasher.hash('secreto123'))
+    assert hasher.canonical_method() == 'scrypt:32768:8:1'
+
+
+def test_hash_with_other_parameters_needs_rehash():
+    hasher = PasswordHasher(method='scrypt', workers=0)
+    old_hash = generate_password_hash('secreto123', method='pbkdf2:sha256:1000')
+
+    assert hasher.needs_rehash(old_hash)
+    assert hasher.verify(old_hash, 'secreto123')